@@ -0,0 +1 @@
+# Helpers shared by the Android analysis scripts in this repository.
@@ -0,0 +1,167 @@
+# SQLite databases opened straight from the members of an extraction ZIP (or TAR).
+# A database member is read into memory and deserialized into an in-memory connection, so nothing is
+# written next to the evidence. When the archive also holds its '-wal' file the pair is replayed in a
+# private temporary directory and copied into memory with the backup API, then the directory is removed.
+# Databases larger than IN_MEMORY_SIZE_LIMIT are read from such a private copy for the whole session.
+# Connections are cached per archive and member for the whole session.
+
+import os
+import shutil
+import sqlite3
+import tarfile
+import tempfile
+import zipfile
+
+from android_common.artifact_catalog import load_catalog
+from android_common.sqlite_connections import apply_read_pragmas, connect_readonly
+
+# Offsets of the file format write/read version bytes in the database header: 2 means WAL mode,
+# which an in-memory database cannot use, 1 means rollback journal
+HEADER_WRITE_VERSION_OFFSET = 18
+HEADER_READ_VERSION_OFFSET = 19
+
+# Members up to this size are loaded into memory; larger ones are read from a private temporary copy
+IN_MEMORY_SIZE_LIMIT = 512 * 1024 * 1024
+
+# Members are read and copied in chunks of this size
+MEMBER_CHUNK_SIZE = 1024 * 1024
+
+def deserialize_database(database_bytes):
+    # The header is patched in place and the bytearray handed to SQLite as is: one copy of the
+    # database is held by the caller and one by SQLite, never more
+    conn = sqlite3.connect(':memory:')
+    if not database_bytes:
+        # An empty file is an empty database
+        return conn
+    if len(database_bytes) > HEADER_READ_VERSION_OFFSET and database_bytes[HEADER_WRITE_VERSION_OFFSET] == 2:
+        database_bytes[HEADER_WRITE_VERSION_OFFSET] = 1
+        database_bytes[HEADER_READ_VERSION_OFFSET] = 1
+    conn.deserialize(database_bytes)
+    return conn
+
+def copy_into_memory(database_path):
+    # Let SQLite replay a WAL next to the file, and copy the result into an in-memory connection
+    source_conn = sqlite3.connect(database_path)
+    conn = sqlite3.connect(':memory:')
+    try:
+        source_conn.backup(conn)
+    finally:
+        source_conn.close()
+    return conn
+
+class ArchiveDatabases:
+    # The SQLite databases of one ZIP or TAR archive, located through its artifact catalog,
+    # opened on first use and kept for the session
+    def __init__(self, zip_path):
+        self.zip_path = zip_path
+        self.catalog = load_catalog(zip_path)
+        if zipfile.is_zipfile(zip_path):
+            self.zip_ref = zipfile.ZipFile(zip_path, 'r')
+            self.tar_ref = None
+        else:
+            self.zip_ref = None
+            self.tar_ref = tarfile.open(zip_path, 'r:*')
+        self.connections = {}
+        # Private copies of databases too large for memory, removed on close
+        self.copy_directories = []
+
+    def open_member(self, member_name):
+        if self.zip_ref is not None:
+            return self.zip_ref.open(member_name)
+        # Read from the data offset saved in the catalog: looking the name up would walk every TAR header again
+        member = self.catalog.get_member(member_name)
+        tar_info = tarfile.TarInfo(member.filename)
+        tar_info.size = member.file_size
+        tar_info.offset_data = member.offset_data
+        return self.tar_ref.extractfile(tar_info)
+
+    def read_member(self, member_name):
+        # Read straight into a preallocated bytearray, chunk by chunk, so no second full-size copy is made
+        member_bytes = bytearray(self.catalog.get_member(member_name).file_size)
+        member_view = memoryview(member_bytes)
+        position = 0
+        with self.open_member(member_name) as member_file:
+            while position < len(member_bytes):
+                read_size = member_file.readinto(member_view[position:position + MEMBER_CHUNK_SIZE])
+                if not read_size:
+                    break
+                position += read_size
+        member_view.release()
+        return member_bytes
+
+    def extract_member(self, member_name, target_path):
+        with self.open_member(member_name) as member_file, open(target_path, 'wb') as target_file:
+            shutil.copyfileobj(member_file, target_file, MEMBER_CHUNK_SIZE)
+
+    def open_database(self, member_name):
+        conn = self.connections.get(member_name)
+        if conn is None:
+            in_memory = self.catalog.get_member(member_name).file_size <= IN_MEMORY_SIZE_LIMIT
+            wal_member = self.catalog.get_member(member_name + '-wal')
+            has_wal = wal_member is not None and wal_member.file_size > 0
+            if in_memory and not has_wal and hasattr(sqlite3.Connection, 'deserialize'):
+                conn = deserialize_database(self.read_member(member_name))
+            else:
+                # The database (and its WAL) copied to a private temporary directory, where SQLite can replay
+                # the WAL; Python < 3.11 has no Connection.deserialize
+                copy_directory = tempfile.mkdtemp(prefix='android_db_')
+                database_path = os.path.join(copy_directory, 'database.db')
+                self.extract_member(member_name, database_path)
+                if has_wal:
+                    self.extract_member(wal_member.filename, database_path + '-wal')
+                if in_memory:
+                    try:
+                        conn = copy_into_memory(database_path)
+                    finally:
+                        shutil.rmtree(copy_directory, ignore_errors=True)
+                else:
+                    conn = sqlite3.connect(database_path)
+                    self.copy_directories.append(copy_directory)
+            # The evidence copy is never modified
+            apply_read_pragmas(conn)
+            self.connections[member_name] = conn
+        return conn
+
+    def release(self, member_name):
+        # Close one cached connection, e.g. a backup analysed once, and free its memory
+        conn = self.connections.pop(member_name, None)
+        if conn is not None:
+            conn.close()
+
+    def close(self):
+        for conn in self.connections.values():
+            conn.close()
+        self.connections.clear()
+        for copy_directory in self.copy_directories:
+            shutil.rmtree(copy_directory, ignore_errors=True)
+        self.copy_directories.clear()
+        if self.zip_ref is not None:
+            self.zip_ref.close()
+        if self.tar_ref is not None:
+            self.tar_ref.close()
+        if opened_archives.get(os.path.abspath(self.zip_path)) is self:
+            del opened_archives[os.path.abspath(self.zip_path)]
+
+# Archives opened during this session, by absolute path
+opened_archives = {}
+
+def open_archive(zip_path):
+    archive_key = os.path.abspath(zip_path)
+    if archive_key not in opened_archives:
+        opened_archives[archive_key] = ArchiveDatabases(zip_path)
+    return opened_archives[archive_key]
+
+def close_archives():
+    for archive in list(opened_archives.values()):
+        archive.close()
+
+def open_database(database_name, zip_path=None, package=None):
+    # 'msgstore.db' from the working directory, or from the WhatsApp database folder inside zip_path
+    # (com.whatsapp unless package names another one; ValueError when the choice is ambiguous)
+    if zip_path is None:
+        return connect_readonly(database_name)
+    archive = open_archive(zip_path)
+    member_name = archive.catalog.find_whatsapp_database(database_name, package)
+    if member_name is None:
+        raise FileNotFoundError(f"'{database_name}' not found in the WhatsApp database folder of '{zip_path}'")
+    return archive.open_database(member_name)
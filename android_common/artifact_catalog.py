@@ -0,0 +1,165 @@
+# Artifact catalog of an extraction archive.
+# The ZIP central directory (or the TAR headers) is read once, the members the analyzers care about are
+# classified (contacts and WhatsApp databases, msgstore backups, WAL files, images) and the result is saved
+# next to the archive as '<archive>.catalog.json'. Later runs, and the other tools, load that file instead
+# of scanning the archive again, as long as the archive's size and modification time are unchanged.
+
+from collections import namedtuple
+import json
+import os
+import posixpath
+import re
+import tarfile
+import zipfile
+
+CATALOG_VERSION = 2
+CATALOG_SUFFIX = '.catalog.json'
+ARCHIVE_EXTENSIONS = ('.zip', '.tar')
+
+# Artifact kinds
+CONTACTS_DATABASE = 'contacts2.db'
+WA_DATABASE = 'wa.db'
+MSGSTORE_DATABASE = 'msgstore.db'
+MSGSTORE_BACKUP = 'msgstore backup'
+DATABASE_WAL = 'database wal'
+IMAGE = 'image'
+
+# Preferred when the archive also holds WhatsApp Business (com.whatsapp.w4b) or clones
+WHATSAPP_PACKAGE = 'com.whatsapp'
+
+# Contacts providers ship as com.android.providers.contacts, com.samsung.android.providers.contacts and other
+# vendor variants; the databases may sit under data/data, data/user/<N> (secondary profiles) or any dump prefix
+CONTACTS_DATABASE_PATTERN = re.compile(r'(^|/)[^/]*providers\.contacts[^/]*/databases/contacts2\.db$')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.bmp')
+
+# Databases of the package's own folder: data/data/com.whatsapp/databases/msgstore.db -> data/data/com.whatsapp
+def get_package_path(database_directory):
+    if posixpath.basename(database_directory) == 'databases':
+        return posixpath.dirname(database_directory)
+    return database_directory
+
+# filename/file_size/CRC mirror the zipfile.ZipInfo attributes, so catalog members can stand in for ZipInfo;
+# offset_data is where a TAR member's data starts (tarfile.TarInfo.offset_data), None in a ZIP
+ArchiveMember = namedtuple('ArchiveMember', 'filename file_size CRC offset_data')
+
+def is_archive_file(filename):
+    return filename.lower().endswith(ARCHIVE_EXTENSIONS)
+
+def classify_member(member_name):
+    basename = posixpath.basename(member_name)
+    lower_basename = basename.lower()
+    if CONTACTS_DATABASE_PATTERN.search(member_name):
+        return CONTACTS_DATABASE
+    if basename == WA_DATABASE:
+        return WA_DATABASE
+    if basename == MSGSTORE_DATABASE:
+        return MSGSTORE_DATABASE
+    if basename.startswith('msgstore') and basename.endswith('.db'):
+        # Decrypted backups (msgstore-2024-01-01.1.db); encrypted .crypt14 files are not readable
+        return MSGSTORE_BACKUP
+    if basename.endswith('.db-wal'):
+        return DATABASE_WAL
+    if lower_basename.endswith(IMAGE_EXTENSIONS):
+        return IMAGE
+    return None
+
+def iter_archive_members(archive_path):
+    if zipfile.is_zipfile(archive_path):
+        with zipfile.ZipFile(archive_path, 'r') as zip_ref:
+            for zip_info in zip_ref.infolist():
+                if not zip_info.is_dir():
+                    yield ArchiveMember(zip_info.filename, zip_info.file_size, zip_info.CRC, None)
+    else:
+        with tarfile.open(archive_path, 'r:*') as tar_ref:
+            for tar_info in tar_ref:
+                if tar_info.isfile():
+                    # TAR headers carry no CRC
+                    yield ArchiveMember(tar_info.name, tar_info.size, None, tar_info.offset_data)
+
+class ArtifactCatalog:
+    def __init__(self, archive_path, members_by_kind):
+        self.archive_path = archive_path
+        self.members_by_kind = members_by_kind
+        self.members_by_name = {member.filename: member for members in members_by_kind.values() for member in members}
+
+    def get_members(self, kind):
+        # In archive order
+        return self.members_by_kind.get(kind, [])
+
+    def get_member_names(self, kind):
+        return sorted(member.filename for member in self.get_members(kind))
+
+    def get_member(self, member_name):
+        return self.members_by_name.get(member_name)
+
+    def get_whatsapp_directory(self, package=None):
+        # The one folder msgstore.db and wa.db are both read from. WhatsApp (com.whatsapp) is preferred over
+        # WhatsApp Business (com.whatsapp.w4b); package selects a folder by package name or path instead
+        directories = sorted({posixpath.dirname(member_name) for kind in (MSGSTORE_DATABASE, WA_DATABASE)
+                              for member_name in self.get_member_names(kind)})
+        if package:
+            package = package.strip('/')
+            directories = [directory for directory in directories
+                           if get_package_path(directory) == package or get_package_path(directory).endswith('/' + package)]
+        else:
+            directories = [directory for directory in directories if posixpath.basename(get_package_path(directory)) == WHATSAPP_PACKAGE] or directories
+        if len(directories) > 1:
+            raise ValueError(f"several WhatsApp database folders in '{self.archive_path}': {', '.join(directories)}; "
+                             "choose one by package name or path")
+        return directories[0] if directories else None
+
+    def find_whatsapp_database(self, database_name, package=None):
+        directory = self.get_whatsapp_directory(package)
+        if directory is None:
+            return None
+        member_name = posixpath.join(directory, database_name)
+        return member_name if member_name in self.members_by_name else None
+
+def get_archive_fingerprint(archive_path):
+    archive_stat = os.stat(archive_path)
+    return {'version': CATALOG_VERSION, 'size': archive_stat.st_size, 'mtime_ns': archive_stat.st_mtime_ns}
+
+def build_catalog(archive_path):
+    members_by_kind = {}
+    for member in iter_archive_members(archive_path):
+        kind = classify_member(member.filename)
+        if kind:
+            members_by_kind.setdefault(kind, []).append(member)
+    return ArtifactCatalog(archive_path, members_by_kind)
+
+def read_saved_catalog(archive_path, catalog_path):
+    try:
+        with open(catalog_path, encoding='utf-8') as catalog_file:
+            saved_catalog = json.load(catalog_file)
+    except (OSError, ValueError):
+        return None
+    if saved_catalog.get('archive') != get_archive_fingerprint(archive_path):
+        return None
+    members_by_kind = {kind: [ArchiveMember(*member) for member in members] for kind, members in saved_catalog['members'].items()}
+    return ArtifactCatalog(archive_path, members_by_kind)
+
+def save_catalog(catalog, catalog_path):
+    saved_catalog = {
+        'archive': get_archive_fingerprint(catalog.archive_path),
+        'members': {kind: [list(member) for member in members] for kind, members in catalog.members_by_kind.items()},
+    }
+    try:
+        with open(catalog_path, 'w', encoding='utf-8') as catalog_file:
+            json.dump(saved_catalog, catalog_file)
+    except OSError:
+        # Read-only evidence folders still work, the archive is just scanned again next time
+        pass
+
+# Catalogs loaded during this session, by absolute archive path
+loaded_catalogs = {}
+
+def load_catalog(archive_path):
+    archive_key = os.path.abspath(archive_path)
+    if archive_key not in loaded_catalogs:
+        catalog_path = archive_path + CATALOG_SUFFIX
+        catalog = read_saved_catalog(archive_path, catalog_path)
+        if catalog is None:
+            catalog = build_catalog(archive_path)
+            save_catalog(catalog, catalog_path)
+        loaded_catalogs[archive_key] = catalog
+    return loaded_catalogs[archive_key]
@@ -0,0 +1,94 @@
+# Phone number canonicalization and suffix matching.
+# Numbers from contacts2.db, wa.db JIDs and vCards are reduced to digit strings and indexed by their
+# reversed digits, so matches between numbers written with and without a country prefix are binary
+# searches instead of scans over every contact.
+
+import re
+from bisect import bisect_left
+from collections import defaultdict
+
+# Android matches phone numbers on their last 7 digits (phone_lookup.min_match)
+MIN_MATCH_DIGITS = 7
+
+# JID servers that carry a phone number in the user part
+PHONE_NUMBER_SERVERS = ('s.whatsapp.net', 'c.us')
+
+def canonicalize_number(raw_number):
+    # '+39 333 123-4567', '0039 3331234567' and '393331234567@s.whatsapp.net' all become '393331234567'.
+    # Group, broadcast and LID JIDs have no phone number and return None.
+    if raw_number is None:
+        return None
+    raw_number = str(raw_number).strip()
+    if '@' in raw_number:
+        user, server = raw_number.split('@', 1)
+        if server not in PHONE_NUMBER_SERVERS:
+            return None
+        raw_number = user.split(':')[0].split('.')[0]
+    digits = re.sub(r'\D', '', raw_number)
+    if raw_number.startswith('00'):
+        digits = digits[2:]
+    return digits or None
+
+class PhoneNumberIndex:
+    # Canonical numbers kept sorted by their reversed digits: every number ending with a given
+    # suffix is one contiguous range, found with two binary searches.
+    def __init__(self, min_match_digits=MIN_MATCH_DIGITS):
+        self.min_match_digits = min_match_digits
+        self.items_by_number = defaultdict(list)
+        self.reversed_numbers = None
+
+    def __len__(self):
+        return len(self.items_by_number)
+
+    def add(self, raw_number, item):
+        canonical_number = canonicalize_number(raw_number)
+        if canonical_number is None:
+            return None
+        self.items_by_number[canonical_number].append(item)
+        # National numbers with a trunk '0' (07700 900123) are also reachable from the international form (44 7700 900123)
+        if canonical_number.startswith('0') and len(canonical_number) > self.min_match_digits:
+            self.items_by_number[canonical_number[1:]].append(item)
+        self.reversed_numbers = None
+        return canonical_number
+
+    def get_reversed_numbers(self):
+        if self.reversed_numbers is None:
+            self.reversed_numbers = sorted(number[::-1] for number in self.items_by_number)
+        return self.reversed_numbers
+
+    def find_numbers_ending_with(self, digits):
+        # ':' sorts right after '9', so [suffix, suffix + ':') covers every number ending with the suffix
+        reversed_numbers = self.get_reversed_numbers()
+        reversed_suffix = digits[::-1]
+        start = bisect_left(reversed_numbers, reversed_suffix)
+        end = bisect_left(reversed_numbers, reversed_suffix + ':', start)
+        return [reversed_number[::-1] for reversed_number in reversed_numbers[start:end]]
+
+    def match_numbers(self, raw_number):
+        # Prefix-insensitive lookup: stored numbers ending with the query, plus stored numbers the query ends with
+        canonical_number = canonicalize_number(raw_number)
+        if canonical_number is None or len(canonical_number) < self.min_match_digits:
+            return []
+        if canonical_number.startswith('0') and len(canonical_number) > self.min_match_digits:
+            canonical_number = canonical_number[1:]
+        matched_numbers = self.find_numbers_ending_with(canonical_number)
+        for suffix_length in range(len(canonical_number) - 1, self.min_match_digits - 1, -1):
+            suffix = canonical_number[-suffix_length:]
+            if suffix in self.items_by_number:
+                matched_numbers.append(suffix)
+        # Exact matches first, then the closest lengths
+        return sorted(set(matched_numbers), key=lambda number: (number != canonical_number, abs(len(number) - len(canonical_number)), number))
+
+    def match(self, raw_number):
+        return self.get_unique_items(self.match_numbers(raw_number))
+
+    def get_unique_items(self, numbers):
+        # A national number is stored under two keys; report each item once
+        seen_items = set()
+        unique_items = []
+        for number in numbers:
+            for item in self.items_by_number[number]:
+                if id(item) not in seen_items:
+                    seen_items.add(id(item))
+                    unique_items.append(item)
+        return unique_items
@@ -0,0 +1,26 @@
+# Streaming query execution.
+# Rows are pulled from the cursor in fetchmany batches and handed on one at a time, so report stages
+# aggregate or print as the rows arrive and memory stays bounded by the batch, not by the result size.
+
+from android_common.sqlite_connections import log_query_plan
+
+# Rows fetched from SQLite per round trip
+QUERY_BATCH_SIZE = 5000
+
+def iterate_cursor(cursor, batch_size=QUERY_BATCH_SIZE):
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        yield from rows
+
+def stream_query(conn, query, parameters=(), batch_size=QUERY_BATCH_SIZE):
+    # Run a query and yield its rows as plain tuples
+    log_query_plan(conn, query, parameters)
+    cursor = conn.cursor()
+    cursor.arraysize = batch_size
+    cursor.execute(query, parameters)
+    try:
+        yield from iterate_cursor(cursor, batch_size)
+    finally:
+        cursor.close()
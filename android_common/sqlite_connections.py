@@ -0,0 +1,59 @@
+# Read-only SQLite connections for evidence databases.
+# Files are opened through 'file:...?mode=ro&immutable=1' URIs, so SQLite never writes to them (no journal,
+# no -shm, no locking), and every connection gets pragmas suited to large sequential read-only scans.
+# Query plans can be logged on request, with full table scans flagged.
+
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+from urllib.request import pathname2url
+
+# Memory-mapped I/O window and page cache (negative = KiB). temp_store stays at its default, so the temporary b-trees of
+# GROUP BY/ORDER BY/DISTINCT over large databases spill to disk instead of growing in RAM
+READ_MMAP_SIZE = 256 * 1024 * 1024
+READ_CACHE_SIZE_KIB = 64 * 1024
+
+# Where EXPLAIN QUERY PLAN output goes once enabled (None = disabled)
+query_plan_log = None
+
+# Copies of databases with a pending WAL; kept until the process exits
+wal_database_copies = []
+
+def apply_read_pragmas(conn):
+    conn.execute(f"PRAGMA mmap_size = {READ_MMAP_SIZE}")
+    conn.execute(f"PRAGMA cache_size = -{READ_CACHE_SIZE_KIB}")
+    conn.execute("PRAGMA query_only = ON")
+    return conn
+
+def connect_readonly(database_path):
+    wal_path = database_path + '-wal'
+    if os.path.exists(wal_path) and os.path.getsize(wal_path) > 0:
+        # immutable=1 would ignore the WAL and its uncheckpointed rows: read a private copy instead
+        copy_directory = tempfile.TemporaryDirectory(prefix='android_db_')
+        wal_database_copies.append(copy_directory)
+        copy_path = os.path.join(copy_directory.name, os.path.basename(database_path))
+        shutil.copyfile(database_path, copy_path)
+        shutil.copyfile(wal_path, copy_path + '-wal')
+        conn = sqlite3.connect(copy_path)
+    else:
+        conn = sqlite3.connect(f"file:{pathname2url(os.path.abspath(database_path))}?mode=ro&immutable=1", uri=True)
+    return apply_read_pragmas(conn)
+
+def enable_query_plan_logging(log_file=None):
+    global query_plan_log
+    query_plan_log = log_file or sys.stderr
+
+def log_query_plan(conn, query, parameters=()):
+    if query_plan_log is None:
+        return
+    plan_rows = conn.execute("EXPLAIN QUERY PLAN " + query, parameters).fetchall()
+    print("Query plan for:", re.sub(r'\s+', ' ', query).strip()[:120], file=query_plan_log)
+    depths = {0: 0}
+    for node_id, parent_id, _, detail in plan_rows:
+        depths[node_id] = depths.get(parent_id, 0) + 1
+        # 'SCAN table' reads every row; 'SEARCH' uses an index or the rowid
+        flag = "FULL SCAN -> " if detail.startswith('SCAN ') and not detail.startswith('SCAN CONSTANT ROW') else ""
+        print("  " * depths[node_id] + flag + detail, file=query_plan_log)
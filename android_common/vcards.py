@@ -0,0 +1,117 @@
+# Streaming vCard 2.1 / 3.0 / 4.0 parser.
+# Shared contact cards are unfolded line by line, split into content lines (group.NAME;params:value)
+# and reduced to one record per telephone number, keeping the item group labels (item2.X-ABLabel)
+# and the WhatsApp id (waid) that WhatsApp adds to TEL lines.
+
+from collections import namedtuple
+import quopri
+import re
+
+VCardPhone = namedtuple('VCardPhone', 'fn tel label waid')
+
+# Apple/Google label wrapper: item1.X-ABLabel:_$!<Mobile>!$_
+AB_LABEL_PATTERN = re.compile(r'^_\$!<(.*)>!\$_$')
+
+# TYPE values that say nothing useful about the number
+IGNORED_TEL_TYPES = ('PREF', 'VOICE', 'INTERNET')
+
+def iter_unfolded_lines(vcard_text):
+    # RFC 6350/2425 folding: a line starting with a space or tab continues the previous one.
+    # vCard 2.1 quoted-printable values continue after a trailing '=' (soft line break).
+    current_line = None
+    for raw_line in vcard_text.replace('\r\n', '\n').replace('\r', '\n').split('\n'):
+        if current_line is not None and raw_line[:1] in (' ', '\t'):
+            current_line += raw_line[1:]
+            continue
+        if current_line is not None and current_line.endswith('=') and 'QUOTED-PRINTABLE' in current_line.split(':', 1)[0].upper():
+            current_line = current_line[:-1] + raw_line
+            continue
+        if current_line:
+            yield current_line
+        current_line = raw_line
+    if current_line:
+        yield current_line
+
+def split_unquoted(text, separator):
+    # Split on a separator that is not inside a double-quoted parameter value
+    parts = []
+    current_part = []
+    in_quotes = False
+    for character in text:
+        if character == '"':
+            in_quotes = not in_quotes
+        elif character == separator and not in_quotes:
+            parts.append(''.join(current_part))
+            current_part = []
+            continue
+        current_part.append(character)
+    parts.append(''.join(current_part))
+    return parts
+
+def parse_content_line(line):
+    # 'item1.TEL;type=CELL;waid=393331234567:+39 333 123 4567' -> ('item1', 'TEL', {'TYPE': ['CELL'], 'WAID': [...]}, value)
+    name_and_params = split_unquoted(line, ':')
+    if len(name_and_params) < 2:
+        return None
+    value = line[len(name_and_params[0]) + 1:]
+    name_parts = split_unquoted(name_and_params[0], ';')
+    group, _, name = name_parts[0].rpartition('.')
+    params = {}
+    for param in name_parts[1:]:
+        param_name, has_value, param_value = param.partition('=')
+        if not has_value:
+            # vCard 2.1 bare parameters: TEL;CELL;PREF:...
+            param_name, param_value = 'TYPE', param_name
+        params.setdefault(param_name.strip().upper(), []).extend(
+            value_part.strip().strip('"') for value_part in split_unquoted(param_value, ','))
+    # vCard 2.1 writes the encoding either as ENCODING=QUOTED-PRINTABLE or as a bare parameter
+    if 'QUOTED-PRINTABLE' in [encoding.upper() for encoding in params.get('ENCODING', []) + params.get('TYPE', [])]:
+        decoded_value = quopri.decodestring(value.encode('utf-8'))
+        try:
+            value = decoded_value.decode((params.get('CHARSET') or ['utf-8'])[0], 'replace')
+        except LookupError:
+            value = decoded_value.decode('utf-8', 'replace')
+    return group.lower(), name.upper(), params, value
+
+def unescape_value(value):
+    return value.replace('\\n', ' ').replace('\\N', ' ').replace('\\,', ',').replace('\\;', ';').replace('\\\\', '\\').strip()
+
+def get_tel_label(params, group_labels, group):
+    if group and group in group_labels:
+        return group_labels[group]
+    tel_types = [param_type for param_type in params.get('TYPE', []) if param_type and param_type.upper() not in IGNORED_TEL_TYPES and param_type.upper() != 'QUOTED-PRINTABLE']
+    return ','.join(tel_types)
+
+def iter_vcard_phones(vcard_text):
+    # One VCardPhone per TEL line of every card in the text; cards without FN fall back to N
+    fn = name = None
+    tel_lines = []
+    group_labels = {}
+    for line in iter_unfolded_lines(vcard_text):
+        content_line = parse_content_line(line)
+        if content_line is None:
+            continue
+        group, property_name, params, value = content_line
+        if property_name == 'BEGIN' and value.strip().upper() == 'VCARD':
+            fn = name = None
+            tel_lines = []
+            group_labels = {}
+        elif property_name == 'FN':
+            fn = unescape_value(value)
+        elif property_name == 'N':
+            name = ' '.join(part.strip() for part in reversed(split_unquoted(value, ';')[:2]) if part.strip())
+        elif property_name == 'TEL':
+            tel_lines.append((group, params, value))
+        elif property_name == 'X-ABLABEL' and group:
+            label_match = AB_LABEL_PATTERN.match(value.strip())
+            group_labels[group] = label_match.group(1) if label_match else unescape_value(value)
+        elif property_name == 'END' and value.strip().upper() == 'VCARD':
+            for tel_group, tel_params, tel_value in tel_lines:
+                tel = unescape_value(tel_value)
+                if tel.lower().startswith('tel:'):
+                    # vCard 4.0 TEL;VALUE=uri:tel:+39-333-123-4567;ext=1
+                    tel = tel[4:].split(';')[0]
+                waid = (tel_params.get('WAID') or [None])[0]
+                if tel or waid:
+                    yield VCardPhone(fn or name or '', tel, get_tel_label(tel_params, group_labels, tel_group), waid)
+            tel_lines = []
@@ -0,0 +1,193 @@
+# Benchmark Suite
+# Times the camera inspector, contacts analyzer, message exchange reporter, self-destruction reporter and vCard
+# filter end to end on synthetic extractions, and the camera inspector per stage. For every run it records the
+# wall time, the time until the first line of output, the throughput (images/s or message rows/s) and the peak
+# resident set size, and writes the results as JSON so runs can be compared across commits.
+
+import argparse
+import contextlib
+import importlib.util
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import synthetic_fixtures
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CAMERA_SCRIPT = os.path.join(REPO_ROOT, 'camera', 'AndroidCameraModelInspector.py')
+CONTACTS_SCRIPT = os.path.join(REPO_ROOT, 'whatsapp', 'contacts', 'AndroidContactsAnalyzer.py')
+EXCHANGE_SCRIPT = os.path.join(REPO_ROOT, 'whatsapp', 'messages', 'android_wa-message_exchange_reporter.py')
+SELF_DESTRUCTION_SCRIPT = os.path.join(REPO_ROOT, 'whatsapp', 'messages', 'android_wa-self-destruction_messages_reporter.py')
+VCARD_SCRIPT = os.path.join(REPO_ROOT, 'whatsapp', 'vcards', 'android_wa-vcard_filtering.py')
+
+def prepare_fixtures(fixture_directory, args):
+    # Fixtures are reused when the scale parameters match the previous run
+    scale = {'images': args.images, 'messages': args.messages, 'chats': args.chats, 'contacts': args.contacts, 'backups': args.backups, 'seed': args.seed}
+    scale_path = os.path.join(fixture_directory, 'scale.json')
+    if os.path.exists(scale_path):
+        with open(scale_path) as scale_file:
+            if json.load(scale_file) == scale:
+                return
+    shutil.rmtree(fixture_directory, ignore_errors=True)
+    os.makedirs(fixture_directory)
+    print("Generating fixtures:", scale, file=sys.stderr)
+    synthetic_fixtures.generate_device_zip(os.path.join(fixture_directory, 'device.zip'), fixture_directory,
+                                           args.images, args.messages, args.chats, args.contacts, args.seed)
+    synthetic_fixtures.generate_msgstore_backups(os.path.join(fixture_directory, 'msgstore.db'), fixture_directory, args.backups, args.seed)
+    with open(scale_path, 'w') as scale_file:
+        json.dump(scale, scale_file)
+
+def link_inputs(fixture_directory, work_directory, filenames):
+    # Each tool gets its own directory that only contains the inputs it is expected to find
+    shutil.rmtree(work_directory, ignore_errors=True)
+    os.makedirs(work_directory)
+    for filename in filenames:
+        os.symlink(os.path.join(fixture_directory, filename), os.path.join(work_directory, filename))
+
+def run_script(script_path, script_arguments, stdin_text, work_directory):
+    # Run one tool in a child process; os.wait4 gives the resource usage of that child alone
+    start_time = time.perf_counter()
+    process = subprocess.Popen([sys.executable, script_path] + script_arguments, cwd=work_directory,
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    process.stdin.write(stdin_text.encode())
+    process.stdin.close()
+    first_output_seconds = None
+    output_lines = 0
+    for line in process.stdout:
+        if first_output_seconds is None and line.strip():
+            first_output_seconds = time.perf_counter() - start_time
+        output_lines += 1
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return {
+        'seconds': time.perf_counter() - start_time,
+        'first_output_seconds': first_output_seconds,
+        'output_lines': output_lines,
+        'peak_rss_kb': usage.ru_maxrss,
+        'returncode': process.returncode,
+    }
+
+def get_end_to_end_benchmarks(args):
+    backups = [os.path.basename(path) for path in sorted(os.listdir(args.fixture_directory)) if path.startswith('msgstore-')]
+    return [
+        {'name': 'camera_inspector', 'script': CAMERA_SCRIPT, 'arguments': ['--batch', '--geocoder', 'none'], 'stdin': '',
+         'inputs': ['device.zip'], 'unit': 'images', 'count': args.images},
+        {'name': 'contacts_analyzer', 'script': CONTACTS_SCRIPT, 'arguments': [], 'stdin': 'Contact 1\nyes\n39\nno\nq\n',
+         'inputs': ['device.zip'], 'unit': 'rows', 'count': args.contacts},
+        {'name': 'message_exchange_reporter', 'script': EXCHANGE_SCRIPT, 'arguments': [], 'stdin': '\n',
+         'inputs': ['msgstore.db', 'wa.db'], 'unit': 'rows', 'count': args.messages},
+        {'name': 'self_destruction_reporter', 'script': SELF_DESTRUCTION_SCRIPT, 'arguments': [], 'stdin': '\n\nyes\n',
+         'inputs': ['msgstore.db', 'wa.db'] + backups, 'unit': 'rows', 'count': args.messages * (len(backups) + 1)},
+        {'name': 'vcard_filter', 'script': VCARD_SCRIPT, 'arguments': [], 'stdin': '',
+         'inputs': ['msgstore.db'], 'unit': 'rows', 'count': args.messages},
+    ]
+
+def load_camera_module():
+    spec = importlib.util.spec_from_file_location('android_camera_model_inspector', CAMERA_SCRIPT)
+    camera_module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(camera_module)
+    return camera_module
+
+def time_stage(results, benchmark_name, stage_name, unit, count, function, *function_arguments):
+    # The camera functions print per-image details; keep them out of the JSON output
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        start_time = time.perf_counter()
+        value = function(*function_arguments)
+        seconds = time.perf_counter() - start_time
+    results.append({
+        'benchmark': benchmark_name,
+        'stage': stage_name,
+        'seconds': seconds,
+        'unit': unit,
+        'count': count,
+        'throughput': count / seconds if seconds else None,
+        # ru_maxrss of the benchmark process itself: the peak reached so far, not per stage
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    })
+    return value
+
+def run_camera_stages(args, results):
+    camera_module = load_camera_module()
+    work_directory = os.path.join(args.work_directory, 'camera_stages')
+    link_inputs(args.fixture_directory, work_directory, ['device.zip'])
+    report_directory = os.path.join(work_directory, 'images_exif')
+
+    image_index = time_stage(results, 'camera_inspector', 'index', 'images', args.images, camera_module.build_exif_index, work_directory)
+    dhash_index = time_stage(results, 'camera_inspector', 'index_with_dhash', 'images', args.images, camera_module.build_exif_index, work_directory, None, None, True)
+    time_stage(results, 'camera_inspector', 'near_duplicates', 'images', args.images, camera_module.find_near_duplicates, dhash_index, 10)
+
+    report_writer = camera_module.ImageReportWriter(report_directory, 'jsonl', ['sha1'])
+    geocoder = camera_module.create_geocoder('none')
+    selected_images = camera_module.select_images(image_index)
+    time_stage(results, 'camera_inspector', 'export', 'images', len(selected_images), camera_module.export_images,
+               selected_images, report_directory, report_writer, geocoder, ['sha1'])
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        report_writer.close()
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmark the Android analysis scripts on synthetic extractions.")
+    parser.add_argument('--images', type=int, default=2000, help="number of images in the synthetic device ZIP (default: 2000)")
+    parser.add_argument('--messages', type=int, default=1000000, help="number of message rows in msgstore.db (default: 1000000)")
+    parser.add_argument('--chats', type=int, default=5000, help="number of chats/JIDs (default: 5000)")
+    parser.add_argument('--contacts', type=int, default=20000, help="number of contacts in wa.db and contacts2.db (default: 20000)")
+    parser.add_argument('--backups', type=int, default=7, help="number of msgstore backups (default: 7)")
+    parser.add_argument('--seed', type=int, default=0, help="random seed for the fixtures (default: 0)")
+    parser.add_argument('--repeat', type=int, default=1, help="number of runs per benchmark (default: 1)")
+    parser.add_argument('--only', action='append', help="run only this benchmark (can be repeated)")
+    parser.add_argument('--skip-stages', action='store_true', help="skip the in-process per-stage camera benchmarks")
+    parser.add_argument('--fixture-directory', default=os.path.join(tempfile.gettempdir(), 'android_scripts_benchmark_fixtures'),
+                        help="where fixtures are generated and cached between runs")
+    parser.add_argument('--output', help="write the JSON results to this file instead of standard output")
+    return parser.parse_args()
+
+def main():
+    args = parse_arguments()
+    prepare_fixtures(args.fixture_directory, args)
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_directory:
+        args.work_directory = work_directory
+        for benchmark in get_end_to_end_benchmarks(args):
+            if args.only and benchmark['name'] not in args.only:
+                continue
+            for run_number in range(1, args.repeat + 1):
+                benchmark_directory = os.path.join(work_directory, benchmark['name'])
+                link_inputs(args.fixture_directory, benchmark_directory, benchmark['inputs'])
+                print(f"Running {benchmark['name']} (run {run_number}/{args.repeat})...", file=sys.stderr)
+                run_result = run_script(benchmark['script'], benchmark['arguments'], benchmark['stdin'], benchmark_directory)
+                run_result.update({
+                    'benchmark': benchmark['name'],
+                    'stage': 'end_to_end',
+                    'run': run_number,
+                    'unit': benchmark['unit'],
+                    'count': benchmark['count'],
+                    'throughput': benchmark['count'] / run_result['seconds'] if run_result['seconds'] else None,
+                })
+                results.append(run_result)
+
+        if not args.skip_stages and (not args.only or 'camera_inspector' in args.only):
+            print("Running camera_inspector stages...", file=sys.stderr)
+            run_camera_stages(args, results)
+
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'scale': {'images': args.images, 'messages': args.messages, 'chats': args.chats, 'contacts': args.contacts, 'backups': args.backups, 'seed': args.seed},
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+        print("Benchmark results saved to:", args.output, file=sys.stderr)
+    else:
+        print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
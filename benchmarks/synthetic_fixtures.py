@@ -0,0 +1,246 @@
+# Synthetic Device Extraction Generator
+# Builds reproducible inputs for the benchmark suite: ZIP archives with JPEG/PNG images carrying randomized
+# EXIF Make/Model/GPS tags, and 'msgstore.db', 'wa.db' and 'contacts2.db' databases with WhatsApp/Android
+# compatible schemas. Every generator is seeded, so the same scale parameters always produce the same files.
+
+import argparse
+import io
+import os
+import random
+import shutil
+import sqlite3
+import zipfile
+
+CAMERA_MODELS = [
+    ('samsung', 'SM-G991B'), ('samsung', 'SM-A525F'), ('Apple', 'iPhone 12'), ('Google', 'Pixel 7'),
+    ('Xiaomi', 'M2101K6G'), ('HUAWEI', 'ELS-NX9'), ('OnePlus', 'LE2123'), ('motorola', 'moto g(60)'),
+]
+CONTACTS_DATABASE_PATH = 'data/data/com.samsung.android.providers.contacts/databases/contacts2.db'
+WA_DATABASE_PATH = 'data/data/com.whatsapp/databases/wa.db'
+MSGSTORE_DATABASE_PATH = 'data/data/com.whatsapp/databases/msgstore.db'
+EPHEMERAL_DURATIONS = [0, 86400, 7 * 86400, 90 * 86400]
+FIRST_TIMESTAMP_MS = 1577836800000  # 2020-01-01
+
+def to_rational_dms(value):
+    value = abs(value)
+    degrees = int(value)
+    minutes = int((value - degrees) * 60)
+    seconds = round(((value - degrees) * 60 - minutes) * 60 * 100)
+    return ((degrees, 1), (minutes, 1), (seconds, 100))
+
+def make_image(rng, image_format, with_gps):
+    # Imports are local so the database fixtures can be generated without Pillow/piexif installed
+    import piexif
+    from PIL import Image
+
+    make, model = rng.choice(CAMERA_MODELS)
+    timestamp = f"{rng.randint(2019, 2024)}:{rng.randint(1, 12):02d}:{rng.randint(1, 28):02d} {rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00"
+    exif_tags = {
+        '0th': {piexif.ImageIFD.Make: make, piexif.ImageIFD.Model: model, piexif.ImageIFD.DateTime: timestamp},
+        'Exif': {piexif.ExifIFD.DateTimeOriginal: timestamp},
+        'GPS': {},
+    }
+    if with_gps:
+        # A handful of recurring places, as on a real phone
+        latitude = rng.choice([45.4642, 41.9028, 40.8518, 48.8566]) + rng.uniform(-0.01, 0.01)
+        longitude = rng.choice([9.19, 12.4964, 14.2681, 2.3522]) + rng.uniform(-0.01, 0.01)
+        exif_tags['GPS'] = {
+            piexif.GPSIFD.GPSLatitudeRef: b'N' if latitude >= 0 else b'S',
+            piexif.GPSIFD.GPSLatitude: to_rational_dms(latitude),
+            piexif.GPSIFD.GPSLongitudeRef: b'E' if longitude >= 0 else b'W',
+            piexif.GPSIFD.GPSLongitude: to_rational_dms(longitude),
+            piexif.GPSIFD.GPSAltitudeRef: 0,
+            piexif.GPSIFD.GPSAltitude: (rng.randint(0, 20000), 100),
+        }
+
+    image = Image.new('RGB', (rng.randint(64, 320), rng.randint(64, 240)), tuple(rng.randrange(256) for _ in range(3)))
+    image_bytes = io.BytesIO()
+    image.save(image_bytes, image_format, exif=piexif.dump(exif_tags))
+    return image_bytes.getvalue()
+
+def generate_image_zip(zip_path, image_count, seed=0, gps_ratio=0.3, png_ratio=0.1, extra_files=0):
+    rng = random.Random(seed)
+    with zipfile.ZipFile(zip_path, 'w') as zip_ref:
+        for image_number in range(image_count):
+            is_png = rng.random() < png_ratio
+            folder = rng.choice(['DCIM/Camera', 'Pictures/Screenshots', 'WhatsApp/Media/WhatsApp Images'])
+            extension = 'png' if is_png else 'jpg'
+            image_data = make_image(rng, 'PNG' if is_png else 'JPEG', rng.random() < gps_ratio)
+            zip_ref.writestr(f"Dump/sdcard/{folder}/IMG_{image_number:07d}.{extension}", image_data)
+        for file_number in range(extra_files):
+            zip_ref.writestr(f"Dump/data/misc/file_{file_number:07d}.bin", os.urandom(rng.randint(256, 4096)))
+    return zip_path
+
+def get_phone_number(contact_number):
+    return f"39{3000000000 + contact_number * 7919 % 999999999:010d}"
+
+def generate_wa_db(db_path, contact_count, seed=0):
+    rng = random.Random(seed)
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+        CREATE TABLE wa_contacts (
+            _id INTEGER PRIMARY KEY AUTOINCREMENT, jid TEXT NOT NULL, is_whatsapp_user BOOLEAN NOT NULL,
+            status TEXT, status_timestamp INTEGER, number TEXT, raw_contact_id INTEGER, display_name TEXT,
+            phone_type INTEGER, phone_label TEXT, unseen_msg_count INTEGER, photo_ts INTEGER, thumb_ts INTEGER,
+            photo_id_timestamp INTEGER, given_name TEXT, family_name TEXT, wa_name TEXT, sort_name TEXT
+        )
+    """)
+    conn.executemany(
+        "INSERT INTO wa_contacts (jid, is_whatsapp_user, status, status_timestamp, number, display_name, wa_name) VALUES (?, 1, ?, ?, ?, ?, ?)",
+        (
+            (
+                f"{get_phone_number(contact_number)}@s.whatsapp.net",
+                rng.choice(['Hey there! I am using WhatsApp.', 'Available', 'Busy', None]),
+                FIRST_TIMESTAMP_MS + rng.randint(0, 10 ** 11),
+                f"+{get_phone_number(contact_number)[:2]} {get_phone_number(contact_number)[2:5]} {get_phone_number(contact_number)[5:]}" if rng.random() < 0.8 else None,
+                f"Contact {contact_number}" if rng.random() < 0.9 else None,
+                f"WA User {contact_number}",
+            )
+            for contact_number in range(contact_count)
+        ),
+    )
+    conn.commit()
+    conn.close()
+    return db_path
+
+def generate_contacts2_db(db_path, contact_count, seed=0):
+    rng = random.Random(seed)
+    conn = sqlite3.connect(db_path)
+    conn.executescript("""
+        CREATE TABLE contacts (_id INTEGER PRIMARY KEY AUTOINCREMENT, name_raw_contact_id INTEGER, contact_last_updated_timestamp INTEGER);
+        CREATE TABLE raw_contacts (_id INTEGER PRIMARY KEY AUTOINCREMENT, contact_id INTEGER, display_name TEXT, deleted INTEGER NOT NULL DEFAULT 0);
+        CREATE TABLE mimetypes (_id INTEGER PRIMARY KEY AUTOINCREMENT, mimetype TEXT NOT NULL);
+        CREATE TABLE data (_id INTEGER PRIMARY KEY AUTOINCREMENT, raw_contact_id INTEGER NOT NULL, mimetype_id INTEGER NOT NULL, data1 TEXT);
+        CREATE TABLE phone_lookup (data_id INTEGER REFERENCES data(_id) NOT NULL, raw_contact_id INTEGER REFERENCES raw_contacts(_id) NOT NULL, normalized_number TEXT NOT NULL, min_match TEXT NOT NULL);
+        CREATE INDEX phone_lookup_index ON phone_lookup (normalized_number, raw_contact_id, data_id);
+        INSERT INTO mimetypes (_id, mimetype) VALUES (1, 'vnd.android.cursor.item/phone_v2'), (2, 'vnd.android.cursor.item/name');
+    """)
+    conn.executemany("INSERT INTO raw_contacts (_id, contact_id, display_name) VALUES (?, ?, ?)",
+                     ((contact_number + 1, contact_number + 1, f"Contact {contact_number}") for contact_number in range(contact_count)))
+    conn.executemany("INSERT INTO contacts (_id, name_raw_contact_id, contact_last_updated_timestamp) VALUES (?, ?, ?)",
+                     ((contact_number + 1, contact_number + 1, FIRST_TIMESTAMP_MS + rng.randint(0, 10 ** 11)) for contact_number in range(contact_count)))
+    conn.executemany("INSERT INTO data (_id, raw_contact_id, mimetype_id, data1) VALUES (?, ?, 1, ?)",
+                     ((contact_number + 1, contact_number + 1, f"+{get_phone_number(contact_number)}") for contact_number in range(contact_count)))
+    conn.executemany("INSERT INTO phone_lookup (data_id, raw_contact_id, normalized_number, min_match) VALUES (?, ?, ?, ?)",
+                     ((contact_number + 1, contact_number + 1, f"+{get_phone_number(contact_number)}", get_phone_number(contact_number)[::-1][:7]) for contact_number in range(contact_count)))
+    conn.commit()
+    conn.close()
+    return db_path
+
+def make_vcard(rng, contact_number):
+    phone_number = get_phone_number(contact_number)
+    return "\n".join([
+        "BEGIN:VCARD",
+        "VERSION:3.0",
+        f"N:;Shared {contact_number};;;",
+        f"FN:Shared {contact_number}",
+        f"item1.TEL;waid={phone_number}:+{phone_number[:2]} {phone_number[2:5]} {phone_number[5:]}",
+        f"item1.X-ABLabel:{rng.choice(['Mobile', 'Work', 'Home'])}",
+        "END:VCARD",
+    ])
+
+def generate_msgstore_db(db_path, message_count, chat_count, seed=0, ephemeral_ratio=0.01, vcard_ratio=0.001):
+    rng = random.Random(seed)
+    conn = sqlite3.connect(db_path)
+    conn.executescript("""
+        CREATE TABLE jid (_id INTEGER PRIMARY KEY AUTOINCREMENT, user TEXT NOT NULL, server TEXT NOT NULL, agent INTEGER, device INTEGER, type INTEGER, raw_string TEXT);
+        CREATE TABLE chat (_id INTEGER PRIMARY KEY AUTOINCREMENT, jid_row_id INTEGER UNIQUE, hidden INTEGER, subject TEXT, created_timestamp INTEGER);
+        CREATE TABLE message (_id INTEGER PRIMARY KEY AUTOINCREMENT, chat_row_id INTEGER NOT NULL, from_me INTEGER NOT NULL, key_id TEXT NOT NULL,
+                              sender_jid_row_id INTEGER, status INTEGER, timestamp INTEGER, received_timestamp INTEGER, message_type INTEGER, text_data TEXT);
+        CREATE TABLE message_ephemeral_setting (message_row_id INTEGER PRIMARY KEY, setting_duration INTEGER NOT NULL, setting_reason INTEGER);
+        CREATE TABLE message_vcard (_id INTEGER PRIMARY KEY AUTOINCREMENT, message_row_id INTEGER, vcard TEXT);
+        CREATE INDEX message_chat_index ON message (chat_row_id, timestamp);
+    """)
+    # Groups make up about one chat in ten and have no wa.db counterpart with a phone number
+    jids = []
+    for chat_number in range(chat_count):
+        if chat_number % 10 == 9:
+            user = f"{get_phone_number(chat_number)}-{1600000000 + chat_number}"
+            jids.append((chat_number + 1, user, 'g.us', f"{user}@g.us"))
+        else:
+            user = get_phone_number(chat_number)
+            jids.append((chat_number + 1, user, 's.whatsapp.net', f"{user}@s.whatsapp.net"))
+    conn.executemany("INSERT INTO jid (_id, user, server, raw_string) VALUES (?, ?, ?, ?)", jids)
+    conn.executemany("INSERT INTO chat (_id, jid_row_id, created_timestamp) VALUES (?, ?, ?)",
+                     ((chat_number + 1, chat_number + 1, FIRST_TIMESTAMP_MS) for chat_number in range(chat_count)))
+
+    ephemeral_settings = []
+    vcards = []
+
+    def messages():
+        timestamp = FIRST_TIMESTAMP_MS
+        for message_id in range(1, message_count + 1):
+            timestamp += rng.randint(1000, 600000)
+            # Skewed chat distribution: a few chats carry most of the traffic
+            chat_id = min(int(rng.paretovariate(1.2)), chat_count)
+            message_type = 0
+            if rng.random() < ephemeral_ratio:
+                message_type = 7
+                ephemeral_settings.append((message_id, rng.choice(EPHEMERAL_DURATIONS), 0))
+            elif rng.random() < vcard_ratio:
+                message_type = 4
+                vcards.append((message_id, make_vcard(rng, rng.randrange(chat_count * 2))))
+            yield (message_id, chat_id, rng.random() < 0.45, f"{message_id:016X}", message_type, timestamp, timestamp + rng.randint(0, 5000), 'x' * rng.randint(0, 80))
+
+    conn.executemany(
+        "INSERT INTO message (_id, chat_row_id, from_me, key_id, message_type, timestamp, received_timestamp, text_data) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        messages(),
+    )
+    conn.executemany("INSERT INTO message_ephemeral_setting (message_row_id, setting_duration, setting_reason) VALUES (?, ?, ?)", ephemeral_settings)
+    conn.executemany("INSERT INTO message_vcard (message_row_id, vcard) VALUES (?, ?)", vcards)
+    conn.commit()
+    conn.close()
+    return db_path
+
+def generate_msgstore_backups(msgstore_path, output_directory, backup_count, seed=0):
+    # Daily backups are older snapshots: each one drops the newest messages of the previous
+    rng = random.Random(seed)
+    backup_paths = []
+    with sqlite3.connect(msgstore_path) as conn:
+        max_message_id = conn.execute("SELECT COALESCE(MAX(_id), 0) FROM message").fetchone()[0]
+    for backup_number in range(1, backup_count + 1):
+        backup_path = os.path.join(output_directory, f"msgstore-2024-01-{backup_number:02d}.1.db")
+        shutil.copyfile(msgstore_path, backup_path)
+        cutoff = max_message_id - max_message_id * backup_number // (backup_count * 4)
+        conn = sqlite3.connect(backup_path)
+        conn.execute("DELETE FROM message WHERE _id > ?", (cutoff,))
+        conn.execute("DELETE FROM message_ephemeral_setting WHERE message_row_id > ?", (cutoff,))
+        conn.execute("UPDATE message_ephemeral_setting SET setting_duration = ? WHERE message_row_id % 7 = ?", (rng.choice(EPHEMERAL_DURATIONS), backup_number % 7))
+        conn.commit()
+        conn.execute("VACUUM")
+        conn.close()
+        backup_paths.append(backup_path)
+    return backup_paths
+
+def generate_device_zip(zip_path, output_directory, image_count, message_count, chat_count, contact_count, seed=0):
+    # Full extraction layout: contacts and WhatsApp databases plus media under Dump/
+    contacts_path = generate_contacts2_db(os.path.join(output_directory, 'contacts2.db'), contact_count, seed)
+    wa_path = generate_wa_db(os.path.join(output_directory, 'wa.db'), contact_count, seed)
+    msgstore_path = generate_msgstore_db(os.path.join(output_directory, 'msgstore.db'), message_count, chat_count, seed)
+    generate_image_zip(zip_path, image_count, seed)
+    with zipfile.ZipFile(zip_path, 'a') as zip_ref:
+        zip_ref.write(contacts_path, CONTACTS_DATABASE_PATH)
+        zip_ref.write(wa_path, WA_DATABASE_PATH)
+        zip_ref.write(msgstore_path, MSGSTORE_DATABASE_PATH)
+    return zip_path
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Generate synthetic Android extraction fixtures.")
+    parser.add_argument('output_directory', help="directory the fixtures are written to")
+    parser.add_argument('--images', type=int, default=1000, help="number of images in the device ZIP (default: 1000)")
+    parser.add_argument('--messages', type=int, default=1000000, help="number of rows in the message table (default: 1000000)")
+    parser.add_argument('--chats', type=int, default=5000, help="number of chats/JIDs (default: 5000)")
+    parser.add_argument('--contacts', type=int, default=20000, help="number of contacts in wa.db and contacts2.db (default: 20000)")
+    parser.add_argument('--backups', type=int, default=7, help="number of msgstore backups (default: 7)")
+    parser.add_argument('--seed', type=int, default=0, help="random seed (default: 0)")
+    return parser.parse_args()
+
+def main():
+    args = parse_arguments()
+    os.makedirs(args.output_directory, exist_ok=True)
+    generate_device_zip(os.path.join(args.output_directory, 'device.zip'), args.output_directory, args.images, args.messages, args.chats, args.contacts, args.seed)
+    generate_msgstore_backups(os.path.join(args.output_directory, 'msgstore.db'), args.output_directory, args.backups, args.seed)
+    print("Fixtures written to:", args.output_directory)
+
+if __name__ == '__main__':
+    main()
@@ -1,23 +1,50 @@
 import os
+import sys
 import zipfile
+import struct
+from collections import defaultdict, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import combinations, repeat
+import argparse
 from PIL import Image
-import tempfile
-import shutil
-from collections import defaultdict
 import piexif
 from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut
+from geopy.exc import GeocoderTimedOut, GeocoderServiceError
 import hashlib
-from PIL.ExifTags import TAGS, GPSTAGS
-from datetime import datetime 
-
-print("Android Camera Model Inspector")
-print("Developed by Luca Cadonici")
-print("This script inspects image files in a directory or ZIP archive and extracts EXIF metadata such as camera make, model, GPS information, and more.")
-print("Required libraries: Pillow (PIL), piexif, geopy")
-print("\n")
-print("You can install the required libraries using the following commands:")
-print("pip install Pillow piexif geopy\n")
+import io
+import math
+import csv
+import json
+import sqlite3
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from android_common.artifact_catalog import IMAGE, load_catalog
+
+# EXIF lives in the first segments of a JPEG (APP1) or in an eXIf chunk ahead of the
+# PNG image data, so only the header of each archive member has to be read.
+EXIF_HEADER_LIMIT = 512 * 1024
+JPEG_STANDALONE_MARKERS = {0x01} | set(range(0xD0, 0xD8))
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# Perceptual hash grid: DHASH_SIZE x DHASH_SIZE bits
+DHASH_SIZE = 8
+
+# Narrowest multi-index hashing block; wider blocks (about log2 of the image count) are used for larger sets
+MIH_MIN_BLOCK_BITS = 8
+
+# Archives opened by this process, keyed by path (see get_open_archive)
+open_archives = {}
+
+# Images are copied out of the archives in fixed-size chunks so memory stays bounded
+COPY_CHUNK_SIZE = 1024 * 1024
+# Structured report columns; one column per selected digest is appended
+REPORT_FIELDS = ['archive', 'member', 'make', 'model', 'datetime', 'latitude', 'longitude', 'altitude', 'address']
+REPORT_COLUMN_TYPES = {'latitude': 'REAL', 'longitude': 'REAL', 'altitude': 'REAL'}
+REPORT_EXTENSIONS = {'text': 'txt', 'jsonl': 'jsonl', 'csv': 'csv', 'sqlite': 'db'}
+REPORT_COMMIT_INTERVAL = 100
+HASH_LABELS = {'md5': 'MD5', 'sha1': 'SHA-1', 'sha224': 'SHA-224', 'sha256': 'SHA-256', 'sha384': 'SHA-384', 'sha512': 'SHA-512'}
 
 def get_decimal_from_dms(dms, ref):
     degrees, minutes, seconds = dms
@@ -26,38 +53,188 @@ def get_decimal_from_dms(dms, ref):
         decimal_value = -decimal_value
     return decimal_value
 
-def get_image_metadata_png(image_path):
+def read_jpeg_exif_segment(stream):
+    # Walk the JPEG markers up to the start of scan and return the APP1 Exif payload
+    bytes_read = 2
+    while bytes_read < EXIF_HEADER_LIMIT:
+        marker = stream.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            return None
+        while marker[1] == 0xFF:
+            marker = marker[1:] + stream.read(1)
+            if len(marker) < 2:
+                return None
+        marker_type = marker[1]
+        if marker_type in (0xD9, 0xDA):
+            return None
+        if marker_type in JPEG_STANDALONE_MARKERS:
+            bytes_read += 2
+            continue
+        length_bytes = stream.read(2)
+        if len(length_bytes) < 2:
+            return None
+        segment_length = struct.unpack('>H', length_bytes)[0] - 2
+        segment = stream.read(segment_length)
+        if len(segment) < segment_length:
+            return None
+        if marker_type == 0xE1 and segment.startswith(b'Exif\x00\x00'):
+            return segment
+        bytes_read += 4 + segment_length
+    return None
+
+def read_png_exif_chunk(stream):
+    # Walk the PNG chunks up to the image data and return the eXIf payload (raw TIFF)
+    bytes_read = len(PNG_SIGNATURE)
+    while bytes_read < EXIF_HEADER_LIMIT:
+        chunk_header = stream.read(8)
+        if len(chunk_header) < 8:
+            return None
+        chunk_length, chunk_type = struct.unpack('>I4s', chunk_header)
+        if chunk_type in (b'IDAT', b'IEND'):
+            return None
+        if chunk_type == b'eXIf':
+            chunk_data = stream.read(chunk_length)
+            return chunk_data if len(chunk_data) == chunk_length else None
+        if len(stream.read(chunk_length + 4)) < chunk_length + 4:
+            return None
+        bytes_read += 12 + chunk_length
+    return None
+
+def read_exif_segment(stream):
+    # Return the raw EXIF block of a JPEG or PNG stream without decoding the image
+    signature = stream.read(2)
+    if signature == b'\xff\xd8':
+        return read_jpeg_exif_segment(stream)
+    if signature == PNG_SIGNATURE[:2] and stream.read(6) == PNG_SIGNATURE[2:]:
+        return read_png_exif_chunk(stream)
+    return None
+
+def load_exif_segment(exif_segment):
+    if exif_segment is None:
+        return None
     try:
-        with Image.open(image_path) as img:
-            exif_data = img.getexif()
-            return exif_data
-    except (IOError, OSError):
+        return piexif.load(exif_segment)
+    except Exception:
         return None
 
-def get_image_metadata(image_path):
+def get_image_metadata_from_zip(zip_ref, image_file):
     try:
-        with Image.open(image_path) as img:
-            if img.format == 'GIF':
-                return None
-            else:
-                exif_data = img.getexif()
-                return exif_data
-    except (IOError, OSError):
+        with zip_ref.open(image_file) as img_file:
+            exif_segment = read_exif_segment(img_file)
+    except Exception:
         return None
+    return load_exif_segment(exif_segment)
 
-geolocator = Nominatim(user_agent="my_geocoder", timeout=2000)
-current_directory = '.'
+class RecordingReader:
+    # Keeps the bytes consumed by the EXIF parser so the image can be decoded without a second read
+    def __init__(self, stream):
+        self.stream = stream
+        self.buffer = bytearray()
 
-def find_image_files_in_zip(zip_file_path):
-    image_extensions = ['.jpg', '.jpeg', '.png', '.gif', '.bmp']
-    image_files = []
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.buffer += data
+        return data
 
-    with zipfile.ZipFile(zip_file_path, 'r') as zip_ref:
-        for zip_info in zip_ref.infolist():
-            if any(zip_info.filename.lower().endswith(ext) for ext in image_extensions):
-                image_files.append(zip_info.filename)
+    def read_all(self):
+        return bytes(self.buffer) + self.stream.read()
 
-    return image_files
+def compute_dhash(image_data):
+    # 64-bit difference hash: compares neighbouring pixels of a 9x8 grayscale thumbnail
+    try:
+        with Image.open(io.BytesIO(image_data)) as img:
+            img.draft('L', (DHASH_SIZE * 16, DHASH_SIZE * 16))
+            pixels = img.convert('L').resize((DHASH_SIZE + 1, DHASH_SIZE), Image.LANCZOS).tobytes()
+    except Exception:
+        return None
+    dhash = 0
+    for row in range(DHASH_SIZE):
+        for col in range(DHASH_SIZE):
+            left_pixel = pixels[row * (DHASH_SIZE + 1) + col]
+            right_pixel = pixels[row * (DHASH_SIZE + 1) + col + 1]
+            dhash = (dhash << 1) | (left_pixel > right_pixel)
+    return f"{dhash:0{DHASH_SIZE * DHASH_SIZE // 4}x}"
+
+def get_hamming_distance(first_hash, second_hash):
+    return bin(first_hash ^ second_hash).count('1')
+
+class MultiIndexHash:
+    # Multi-index hashing: the hash is split into blocks, each indexed in its own table. Two hashes at most
+    # max_distance bits apart differ by at most max_distance // block_count bits in at least one block
+    # (pigeonhole), so a search only probes the block values that close to the query's and checks the full
+    # distance of the few candidates found there.
+    def __init__(self, max_distance, item_count, hash_bits=DHASH_SIZE * DHASH_SIZE):
+        # Blocks about log2(item_count) bits wide keep each bucket down to a handful of hashes
+        block_bits = min(max(item_count.bit_length(), MIH_MIN_BLOCK_BITS), hash_bits)
+        block_count = hash_bits // block_bits
+        block_radius = max_distance // block_count
+        self.max_distance = max_distance
+        self.blocks = []
+        block_start = 0
+        for block_number in range(1, block_count + 1):
+            block_width = hash_bits * block_number // block_count - block_start
+            flip_masks = [sum(1 << bit for bit in flipped_bits) for flipped_count in range(min(block_radius, block_width) + 1)
+                          for flipped_bits in combinations(range(block_width), flipped_count)]
+            self.blocks.append((block_start, (1 << block_width) - 1, flip_masks, defaultdict(list)))
+            block_start += block_width
+
+    def add(self, hash_value, item):
+        for block_start, block_mask, _, table in self.blocks:
+            table[(hash_value >> block_start) & block_mask].append((hash_value, item))
+
+    def search(self, hash_value):
+        matches = []
+        seen_items = set()
+        for block_start, block_mask, flip_masks, table in self.blocks:
+            block_value = (hash_value >> block_start) & block_mask
+            for flip_mask in flip_masks:
+                for candidate_hash, item in table.get(block_value ^ flip_mask, ()):
+                    if item not in seen_items:
+                        seen_items.add(item)
+                        if get_hamming_distance(hash_value, candidate_hash) <= self.max_distance:
+                            matches.append(item)
+        return matches
+
+def decode_exif_text(value):
+    if isinstance(value, bytes):
+        value = value.decode('utf-8', errors='replace')
+    return value.strip('\x00').strip() if value else ''
+
+def rational_to_float(value):
+    numerator, denominator = value
+    return numerator / denominator if denominator else 0.0
+
+def get_exif_fields(exif_dict):
+    # Flatten the piexif dictionary into the fields used by the reports
+    zeroth = exif_dict.get("0th", {})
+    exif_ifd = exif_dict.get("Exif", {})
+    gps_data = exif_dict.get("GPS", {})
+    fields = {
+        'make': decode_exif_text(zeroth.get(piexif.ImageIFD.Make)),
+        'model': decode_exif_text(zeroth.get(piexif.ImageIFD.Model)),
+        'datetime': decode_exif_text(zeroth.get(piexif.ImageIFD.DateTime)) or None,
+        'datetime_original': decode_exif_text(exif_ifd.get(piexif.ExifIFD.DateTimeOriginal)) or None,
+        'latitude': None,
+        'longitude': None,
+        'altitude': None,
+    }
+
+    gps_latitude = gps_data.get(piexif.GPSIFD.GPSLatitude, [])
+    gps_longitude = gps_data.get(piexif.GPSIFD.GPSLongitude, [])
+    if len(gps_latitude) >= 3 and len(gps_longitude) >= 3:
+        fields['latitude'] = convert_coordinate(*(rational_to_float(part) for part in gps_latitude[:3]), gps_data.get(piexif.GPSIFD.GPSLatitudeRef, b'N'))
+        fields['longitude'] = convert_coordinate(*(rational_to_float(part) for part in gps_longitude[:3]), gps_data.get(piexif.GPSIFD.GPSLongitudeRef, b'E'))
+
+    gps_altitude = gps_data.get(piexif.GPSIFD.GPSAltitude, (0, 0))
+    if gps_altitude and len(gps_altitude) >= 2 and gps_altitude[1] != 0:
+        altitude = rational_to_float(gps_altitude)
+        if gps_data.get(piexif.GPSIFD.GPSAltitudeRef, 0) == 1:
+            altitude = -altitude
+        fields['altitude'] = altitude
+    return fields
+
+geolocator = Nominatim(user_agent="my_geocoder", timeout=2000)
+current_directory = '.'
 
 def convert_coordinate(degrees, minutes, seconds, direction):
     decimal_value = degrees + (minutes / 60) + (seconds / 3600)
@@ -65,271 +242,698 @@ def convert_coordinate(degrees, minutes, seconds, direction):
         decimal_value = -decimal_value
     return decimal_value
 
-def get_address_from_gps_nominatim(latitude, longitude):
-    try:
+class NominatimBackend:
+    # Online reverse geocoding; failures raise so that they are never cached
+    name = 'nominatim'
+
+    def reverse(self, latitude, longitude):
         location = geolocator.reverse((latitude, longitude), exactly_one=True)
-        if location:
-            return location.address
+        return location.address if location else "Unknown Address"
+
+class KDTree:
+    # Static 3-d tree over points on the unit sphere, used for nearest-place lookups
+    def __init__(self, points):
+        self.nodes = self._build([(point, position) for position, point in enumerate(points)], 0)
+
+    def _build(self, entries, depth):
+        if not entries:
+            return None
+        axis = depth % 3
+        entries.sort(key=lambda entry: entry[0][axis])
+        median = len(entries) // 2
+        return (entries[median], axis, self._build(entries[:median], depth + 1), self._build(entries[median + 1:], depth + 1))
+
+    def nearest(self, target):
+        best = [None, float('inf')]
+        stack = [self.nodes]
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+            (point, position), axis, left, right = node
+            distance = sum((point[i] - target[i]) ** 2 for i in range(3))
+            if distance < best[1]:
+                best[0], best[1] = position, distance
+            delta = target[axis] - point[axis]
+            near, far = (left, right) if delta < 0 else (right, left)
+            # Visit the far side only if the splitting plane is closer than the best match so far
+            if delta * delta < best[1]:
+                stack.append(far)
+            stack.append(near)
+        return best[0]
+
+def to_unit_vector(latitude, longitude):
+    latitude, longitude = math.radians(latitude), math.radians(longitude)
+    return (math.cos(latitude) * math.cos(longitude), math.cos(latitude) * math.sin(longitude), math.sin(latitude))
+
+def get_distance_km(latitude1, longitude1, latitude2, longitude2):
+    latitude1, longitude1, latitude2, longitude2 = map(math.radians, (latitude1, longitude1, latitude2, longitude2))
+    haversine = math.sin((latitude2 - latitude1) / 2) ** 2 + math.cos(latitude1) * math.cos(latitude2) * math.sin((longitude2 - longitude1) / 2) ** 2
+    return 2 * 6371.0 * math.asin(math.sqrt(haversine))
+
+class GazetteerBackend:
+    # Offline nearest-place lookup against a local gazetteer. Accepts GeoNames dumps
+    # (e.g. cities500.txt, tab-separated) or CSV files with name,latitude,longitude columns.
+    name = 'offline'
+
+    def __init__(self, gazetteer_path):
+        self.places = list(self.load_places(gazetteer_path))
+        if not self.places:
+            raise ValueError(f"No places found in gazetteer '{gazetteer_path}'.")
+        self.tree = KDTree([to_unit_vector(latitude, longitude) for _, latitude, longitude in self.places])
+
+    @staticmethod
+    def load_places(gazetteer_path):
+        with open(gazetteer_path, encoding='utf-8') as gazetteer_file:
+            for line in gazetteer_file:
+                if '\t' in line:
+                    columns = line.rstrip('\n').split('\t')
+                    if len(columns) < 11:
+                        continue
+                    # GeoNames: name, latitude, longitude, country code, admin1 code
+                    place_name = ', '.join(part for part in (columns[1], columns[10], columns[8]) if part)
+                    latitude, longitude = columns[4], columns[5]
+                else:
+                    columns = next(csv.reader([line]))
+                    if len(columns) < 3:
+                        continue
+                    place_name, latitude, longitude = columns[0], columns[1], columns[2]
+                try:
+                    yield place_name, float(latitude), float(longitude)
+                except ValueError:
+                    continue
+
+    def reverse(self, latitude, longitude):
+        place_name, place_latitude, place_longitude = self.places[self.tree.nearest(to_unit_vector(latitude, longitude))]
+        distance = get_distance_km(latitude, longitude, place_latitude, place_longitude)
+        return f"{place_name} (nearest place, {distance:.1f} km)"
+
+class NoGeocodingBackend:
+    name = 'none'
+
+    def reverse(self, latitude, longitude):
+        return None
+
+class CachedGeocoder:
+    # Reverse geocoding through an in-memory LRU of rounded coordinates, backed by an
+    # optional on-disk cache, so photos taken at the same place hit the backend only once.
+    def __init__(self, backend, cache_path=None, precision=4, memo_size=4096):
+        self.backend = backend
+        self.precision = precision
+        self.memo_size = memo_size
+        self.memo = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.conn = None
+        if cache_path:
+            self.conn = sqlite3.connect(cache_path)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS geocode_cache (
+                    backend TEXT NOT NULL,
+                    latitude REAL NOT NULL,
+                    longitude REAL NOT NULL,
+                    address TEXT,
+                    PRIMARY KEY (backend, latitude, longitude)
+                )
+            """)
+
+    def reverse(self, latitude, longitude):
+        key = (round(latitude, self.precision), round(longitude, self.precision))
+        if key in self.memo:
+            self.memo.move_to_end(key)
+            self.hits += 1
+            return self.memo[key]
+
+        if self.conn:
+            row = self.conn.execute(
+                "SELECT address FROM geocode_cache WHERE backend = ? AND latitude = ? AND longitude = ?",
+                (self.backend.name, key[0], key[1]),
+            ).fetchone()
+            if row is not None:
+                self.hits += 1
+                self.remember(key, row[0])
+                return row[0]
+
+        self.misses += 1
+        try:
+            address = self.backend.reverse(*key)
+        except GeocoderTimedOut:
+            return "Geocoding service timed out. Unable to retrieve address."
+        except GeocoderServiceError:
+            return "Geocoding service unavailable. Unable to retrieve address."
+        if self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO geocode_cache (backend, latitude, longitude, address) VALUES (?, ?, ?, ?)",
+                (self.backend.name, key[0], key[1], address),
+            )
+        self.remember(key, address)
+        return address
+
+    def remember(self, key, address):
+        self.memo[key] = address
+        if len(self.memo) > self.memo_size:
+            self.memo.popitem(last=False)
+
+    def close(self):
+        if self.conn:
+            self.conn.commit()
+            self.conn.close()
+
+def create_geocoder(backend_name, gazetteer_path=None, cache_path=None, precision=4):
+    if backend_name == 'offline':
+        backend = GazetteerBackend(gazetteer_path)
+    elif backend_name == 'none':
+        backend = NoGeocodingBackend()
+    else:
+        backend = NominatimBackend()
+    return CachedGeocoder(backend, cache_path, precision)
+
+def copy_and_hash_member(zip_ref, image_file, new_image_path, hash_algorithms):
+    # Stream the member to its destination once, updating every selected digest on the way
+    digests = {algorithm: hashlib.new(algorithm) for algorithm in hash_algorithms}
+    with zip_ref.open(image_file) as source_file, open(new_image_path, 'wb') as target_file:
+        for chunk in iter(lambda: source_file.read(COPY_CHUNK_SIZE), b''):
+            for digest in digests.values():
+                digest.update(chunk)
+            target_file.write(chunk)
+    return {algorithm: digest.hexdigest() for algorithm, digest in digests.items()}
+
+def get_hash_label(algorithm):
+    return HASH_LABELS.get(algorithm, algorithm.upper())
+
+class ExifCache:
+    # Persistent store of parsed EXIF fields and SHA-1 hashes, keyed by archive member.
+    # A member is only served from the cache while its CRC and size are unchanged; the SHA-1 recorded at the
+    # first export is checked against the digest computed when the member is copied again.
+    def __init__(self, cache_path):
+        self.conn = sqlite3.connect(cache_path)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS exif_cache (
+                zip_path TEXT NOT NULL,
+                member TEXT NOT NULL,
+                crc INTEGER NOT NULL,
+                file_size INTEGER NOT NULL,
+                metadata TEXT NOT NULL,
+                sha1 TEXT,
+                PRIMARY KEY (zip_path, member)
+            )
+        """)
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, zip_path, zip_info, required_fields=()):
+        row = self.conn.execute(
+            "SELECT metadata, sha1 FROM exif_cache WHERE zip_path = ? AND member = ? AND crc = ? AND file_size = ?",
+            (os.path.abspath(zip_path), zip_info.filename, zip_info.CRC, zip_info.file_size),
+        ).fetchone()
+        image_record = json.loads(row[0]) if row else None
+        if image_record is None or any(field not in image_record for field in required_fields):
+            self.misses += 1
+            return None
+        self.hits += 1
+        image_record['sha1'] = row[1]
+        return image_record
+
+    def store(self, zip_path, zip_info, exif_fields):
+        # Re-parsing an unchanged member (e.g. to add the dhash) keeps its recorded SHA-1; a changed CRC or size
+        # clears it. Returns the SHA-1 still on record, if any.
+        self.conn.execute("""
+            INSERT INTO exif_cache (zip_path, member, crc, file_size, metadata, sha1) VALUES (?, ?, ?, ?, ?, NULL)
+            ON CONFLICT (zip_path, member) DO UPDATE SET
+                metadata = excluded.metadata,
+                sha1 = CASE WHEN crc = excluded.crc AND file_size = excluded.file_size THEN sha1 END,
+                crc = excluded.crc,
+                file_size = excluded.file_size
+        """, (os.path.abspath(zip_path), zip_info.filename, zip_info.CRC, zip_info.file_size, json.dumps(exif_fields)))
+        return self.conn.execute("SELECT sha1 FROM exif_cache WHERE zip_path = ? AND member = ?",
+                                 (os.path.abspath(zip_path), zip_info.filename)).fetchone()[0]
+
+    def store_hash(self, image_record, image_hash):
+        self.conn.execute(
+            "UPDATE exif_cache SET sha1 = ? WHERE zip_path = ? AND member = ? AND crc = ? AND file_size = ?",
+            (image_hash, os.path.abspath(image_record['archive']), image_record['member'], image_record['crc'], image_record['size']),
+        )
+
+    def evict_missing_archives(self):
+        zip_paths = [row[0] for row in self.conn.execute("SELECT DISTINCT zip_path FROM exif_cache")]
+        missing_paths = [(zip_path,) for zip_path in zip_paths if not os.path.exists(zip_path)]
+        self.conn.executemany("DELETE FROM exif_cache WHERE zip_path = ?", missing_paths)
+        return len(missing_paths)
+
+    def commit(self):
+        # Called after every archive indexed and every export batch, so an interrupted run keeps its work
+        self.conn.commit()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+def run_chunked(worker, zip_path, items, executor=None, workers=1):
+    # Hand chunks of the member list to the worker and yield results in input order
+    # One chunk per worker keeps the per-task overhead down; serial runs use a single chunk
+    chunk_size = max(math.ceil(len(items) / workers), 1)
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+    if executor is None:
+        chunk_results = map(worker, repeat(zip_path, len(chunks)), chunks)
+    else:
+        chunk_results = executor.map(worker, repeat(zip_path, len(chunks)), chunks)
+    for chunk_result in chunk_results:
+        yield from chunk_result
+
+def get_open_archive(zip_path):
+    # Each process keeps the archive it is working on open across chunks, so the central directory
+    # of a large archive is parsed once per process instead of once per chunk
+    zip_ref = open_archives.get(zip_path)
+    if zip_ref is None:
+        close_open_archives()
+        zip_ref = open_archives[zip_path] = zipfile.ZipFile(zip_path, 'r')
+    return zip_ref
+
+def close_open_archives():
+    for zip_ref in open_archives.values():
+        zip_ref.close()
+    open_archives.clear()
+
+def parse_members(zip_path, member_names, with_dhash=False):
+    # Worker entry point: parse the EXIF of each member.
+    # With with_dhash the rest of the member is read after the header and hashed perceptually.
+    exif_fields = []
+    zip_ref = get_open_archive(zip_path)
+    for member_name in member_names:
+        if not with_dhash:
+            exif_dict = get_image_metadata_from_zip(zip_ref, member_name)
+            exif_fields.append(get_exif_fields(exif_dict or {}))
+            continue
+        exif_segment = None
+        image_data = b''
+        try:
+            with zip_ref.open(member_name) as img_file:
+                reader = RecordingReader(img_file)
+                exif_segment = read_exif_segment(reader)
+                image_data = reader.read_all()
+        except Exception:
+            pass
+        member_fields = get_exif_fields(load_exif_segment(exif_segment) or {})
+        member_fields['dhash'] = compute_dhash(image_data)
+        exif_fields.append(member_fields)
+    return exif_fields
+
+def copy_members(zip_path, copy_jobs):
+    # Worker entry point: copy each member to its destination, hashing it in the same read
+    zip_ref = get_open_archive(zip_path)
+    return [copy_and_hash_member(zip_ref, member_name, new_image_path, hash_algorithms)
+            for member_name, new_image_path, hash_algorithms in copy_jobs]
+
+def index_archive(zip_path, exif_cache=None, executor=None, workers=1, with_dhash=False):
+    # Read the EXIF header of every image member once and keep what the reports need
+    zip_name = os.path.splitext(os.path.basename(zip_path))[0]
+    # Image members from the archive's artifact catalog; its entries carry filename, file_size and CRC like ZipInfo
+    image_infos = load_catalog(zip_path).get_members(IMAGE)
+
+    required_fields = ('dhash',) if with_dhash else ()
+    cached_records = [exif_cache.lookup(zip_path, zip_info, required_fields) if exif_cache else None for zip_info in image_infos]
+    uncached_positions = [position for position, image_record in enumerate(cached_records) if image_record is None]
+    uncached_members = [image_infos[position].filename for position in uncached_positions]
+    parsed_fields = run_chunked(partial(parse_members, with_dhash=with_dhash), zip_path, uncached_members, executor, workers)
+    for position, exif_fields in zip(uncached_positions, parsed_fields):
+        exif_fields['sha1'] = exif_cache.store(zip_path, image_infos[position], exif_fields) if exif_cache else None
+        cached_records[position] = exif_fields
+    if exif_cache:
+        exif_cache.commit()
+
+    archive_index = []
+    for zip_info, image_record in zip(image_infos, cached_records):
+        image_record.update({
+            'archive': zip_path,
+            'zip_name': zip_name,
+            'member': zip_info.filename,
+            'size': zip_info.file_size,
+            'crc': zip_info.CRC,
+        })
+        archive_index.append(image_record)
+    return archive_index
+
+def build_exif_index(directory, exif_cache=None, executor=None, workers=1, with_dhash=False):
+    # Single pass over every ZIP archive in the directory
+    image_index = []
+    for filename in os.listdir(directory):
+        if filename.lower().endswith('.zip'):
+            zip_path = os.path.join(directory, filename)
+            image_index.extend(index_archive(zip_path, exif_cache, executor, workers, with_dhash))
+    return image_index
+
+def count_images_by_make_model(image_index):
+    metadata_counts = defaultdict(int)
+    for image_record in image_index:
+        if image_record['make'] and image_record['model']:
+            metadata_counts[(image_record['make'], image_record['model'])] += 1
+    return sorted(metadata_counts.items(), key=lambda item: (-item[1], item[0][0], item[0][1]))
+
+def print_make_model_report(sorted_metadata):
+    header = ("Make", "Model", "Count")
+    max_col_width = (max(len(col) for col in header) + 2) * 4
+
+    print("Report - Count of Images Grouped by Make and Model")
+    print("=" * (max_col_width * len(header)))
+    print("{:^{width}} {:^{width}} {:^{width}}".format(header[0], header[1], header[2], width=max_col_width))
+    print("=" * (max_col_width * len(header)))
+
+    for (make, model), total_count in sorted_metadata:
+        print("{:^{width}} {:^{width}} {:^{width}}".format(make, model, total_count, width=max_col_width))
+
+def prompt_make_model(sorted_metadata):
+    valid_make_values = {make for (make, _), _ in sorted_metadata}
+    valid_model_values = {model for (_, model), _ in sorted_metadata}
+
+    while True:
+        selected_make = input("\nEnter the camera make: ").strip()
+        if selected_make in valid_make_values:
+            break
         else:
-            return "Unknown Address"
-    except GeocoderTimedOut:
-        return "Geocoding service timed out. Unable to retrieve address."
-
-all_images_report = []  
-while True:
-    with tempfile.TemporaryDirectory() as temp_dir:
-        metadata_counts = defaultdict(int)
-        latitude = None
-        longitude = None
-        address = None
-        for filename in os.listdir(current_directory):
-            if filename.lower().endswith('.zip'):
-                zip_path = os.path.join(current_directory, filename)
-                zip_name = os.path.splitext(filename)[0]
-                image_files = find_image_files_in_zip(zip_path)
-
-                with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                    zip_ref.extractall(temp_dir)
-
-                for image_file in image_files:
-                    image_path = os.path.join(temp_dir, image_file)
-                    
-                    exif_data = get_image_metadata(image_path)
-                    if exif_data and 271 in exif_data and 272 in exif_data:
-                        make = exif_data.get(271, '').strip()
-                        model = exif_data.get(272, '').strip()
-                        if make and model:
-                            metadata_counts[(make, model)] += 1
-
-        sorted_metadata = sorted(metadata_counts.items(), key=lambda item: (-item[1], item[0][0], item[0][1]))
-
-        header = ("Make", "Model", "Count")
-        max_col_width = (max(len(col) for col in header) + 2) * 4
-
-        print("Report - Count of Images Grouped by Make and Model")
-        print("=" * (max_col_width * len(header)))
-        print("{:^{width}} {:^{width}} {:^{width}}".format(header[0], header[1], header[2], width=max_col_width))
-        print("=" * (max_col_width * len(header)))
-
-        for (make, model), total_count in sorted_metadata:
-            print("{:^{width}} {:^{width}} {:^{width}}".format(make, model, total_count, width=max_col_width))
-
-        valid_make_values = {make for (make, _), _ in sorted_metadata}
-        valid_model_values = {model for (_, model), _ in sorted_metadata}
+            print("Invalid Make value. Please enter a valid Make.")
 
+    while True:
+        selected_model = input("Enter the camera model: ").strip()
+        if selected_model in valid_model_values:
+            break
+        else:
+            print("Invalid Model value. Please enter a valid Model.")
+
+    return selected_make, selected_model
+
+def get_output_subdirectory(output_directory, exif_datetime):
+    # Create subdirectory with EXIF DateTime name
+    subfolder_name = "Unknown date"
+    if exif_datetime:
+        try:
+            exif_datetime_obj = datetime.strptime(exif_datetime, "%Y:%m:%d %H:%M:%S")
+            subfolder_name = exif_datetime_obj.strftime("%Y-%m-%d")
+        except ValueError:
+            pass
+    output_subdirectory = os.path.join(output_directory, subfolder_name)
+    os.makedirs(output_subdirectory, exist_ok=True)
+    return output_subdirectory
+
+def get_unique_image_name(output_subdirectory, image_name, reserved_paths):
+    # Files are copied after all names are chosen, so names picked in this run are tracked too
+    new_image_name = image_name
+    count = 1
+    while os.path.join(output_subdirectory, new_image_name) in reserved_paths or os.path.exists(os.path.join(output_subdirectory, new_image_name)):
+        base_name, extension = os.path.splitext(image_name)
+        new_image_name = f"{base_name}_{count}{extension}"
+        count += 1
+    new_image_path = os.path.join(output_subdirectory, new_image_name)
+    reserved_paths.add(new_image_path)
+    return new_image_path
+
+class ImageReportWriter:
+    # Streams one report per archive, writing and flushing each image as soon as it is processed
+    def __init__(self, report_directory, report_format='text', hash_algorithms=('sha1',)):
+        self.report_directory = report_directory
+        self.report_format = report_format
+        self.hash_algorithms = list(hash_algorithms)
+        self.fieldnames = REPORT_FIELDS + self.hash_algorithms
+        self.reports = {}
+        self.records_written = 0
+
+    def open_report(self, zip_name):
+        os.makedirs(self.report_directory, exist_ok=True)
+        report_path = os.path.join(self.report_directory, f"{zip_name}_exif_image_report.{REPORT_EXTENSIONS[self.report_format]}")
+        if self.report_format == 'sqlite':
+            if os.path.exists(report_path):
+                os.remove(report_path)
+            conn = sqlite3.connect(report_path)
+            column_definitions = ', '.join(f"{field} {REPORT_COLUMN_TYPES.get(field, 'TEXT')}" for field in self.fieldnames)
+            conn.execute(f"CREATE TABLE images ({column_definitions})")
+            return report_path, conn, None
+        report_file = open(report_path, 'w', newline='' if self.report_format == 'csv' else None)
+        csv_writer = None
+        if self.report_format == 'csv':
+            csv_writer = csv.DictWriter(report_file, fieldnames=self.fieldnames)
+            csv_writer.writeheader()
+        return report_path, report_file, csv_writer
+
+    def write(self, report_record):
+        zip_name = report_record['zip_name']
+        if zip_name not in self.reports:
+            self.reports[zip_name] = self.open_report(zip_name)
+        report_path, report_output, csv_writer = self.reports[zip_name]
+        row = {field: report_record.get(field) for field in self.fieldnames}
+
+        if self.report_format == 'sqlite':
+            report_output.execute(f"INSERT INTO images VALUES ({', '.join('?' for _ in self.fieldnames)})", [row[field] for field in self.fieldnames])
+            self.records_written += 1
+            if self.records_written % REPORT_COMMIT_INTERVAL == 0:
+                report_output.commit()
+            return
+        if self.report_format == 'jsonl':
+            report_output.write(json.dumps(row) + "\n")
+        elif self.report_format == 'csv':
+            csv_writer.writerow(row)
+        else:
+            if report_output.tell() > 0:
+                report_output.write("\n")
+            report_lines = [
+                f"Image path: {report_record['image_path_short']}",
+                f"Exif date: {report_record['datetime']}",
+                f"Exif GPS Latitude: {report_record['latitude']}",
+                f"Exif GPS Longitude: {report_record['longitude']}",
+                f"Address: {report_record['address']}",
+            ]
+            report_lines.extend(f"{get_hash_label(algorithm)} Hash: {report_record[algorithm]}" for algorithm in self.hash_algorithms)
+            report_lines.append("=" * 60)
+            report_output.write("\n".join(report_lines))
+        self.records_written += 1
+        report_output.flush()
+
+    def close(self):
+        for report_path, report_output, _ in self.reports.values():
+            if self.report_format == 'sqlite':
+                report_output.commit()
+            report_output.close()
+            print("Report saved to:", report_path)
+
+def report_image(image_record, report_writer, geocoder):
+    image_path_in_zip_short = '/'.join(image_record['member'].split('/')[1:])
+    exif_datetime = image_record['datetime'] or image_record['datetime_original']
+    latitude = image_record['latitude']
+    longitude = image_record['longitude']
+    altitude = image_record['altitude']
+    address = None
+    image_digests = image_record['digests']
+
+    print("Image path:", image_path_in_zip_short)
+    print("Exif date:", exif_datetime)
+    if latitude is not None and longitude is not None:
+        address = geocoder.reverse(latitude, longitude)
+        if altitude is not None:
+            print(f"Exif GPS Altitude: {altitude} meters")
+        print("Exif GPS Latitude:", latitude)
+        print("Exif GPS Longitude:", longitude)
+        print("Address:", address)
+    else:
+        print("Exif GPS Altitude: Not available")
+        print("Exif GPS Latitude: Not available")
+        print("Exif GPS Longitude: Not available")
+    for algorithm, hex_digest in image_digests.items():
+        print(f"{get_hash_label(algorithm)} Hash:", hex_digest)
+    print("=" * 60)
+
+    report_record = {
+        'archive': os.path.basename(image_record['archive']),
+        'zip_name': image_record['zip_name'],
+        'member': image_record['member'],
+        'image_path_short': image_path_in_zip_short,
+        'make': image_record['make'],
+        'model': image_record['model'],
+        'datetime': exif_datetime,
+        'latitude': latitude,
+        'longitude': longitude,
+        'altitude': altitude,
+        'address': address,
+    }
+    report_record.update(image_digests)
+    report_writer.write(report_record)
+
+def find_near_duplicates(image_index, max_distance):
+    # Cluster images whose perceptual hashes differ by at most max_distance bits. Each image is
+    # looked up in the multi-index hash of the images before it, so pairs are found without an O(n^2) scan.
+    hash_index = MultiIndexHash(max_distance, sum(1 for image_record in image_index if image_record.get('dhash')))
+    cluster_parents = {}
+
+    def find_root(position):
+        while cluster_parents[position] != position:
+            cluster_parents[position] = cluster_parents[cluster_parents[position]]
+            position = cluster_parents[position]
+        return position
+
+    for position, image_record in enumerate(image_index):
+        if not image_record.get('dhash'):
+            continue
+        hash_value = int(image_record['dhash'], 16)
+        cluster_parents[position] = position
+        for match_position in hash_index.search(hash_value):
+            cluster_parents[find_root(match_position)] = find_root(position)
+        hash_index.add(hash_value, position)
+
+    clusters = defaultdict(list)
+    for position in cluster_parents:
+        clusters[find_root(position)].append(position)
+    return sorted((sorted(positions) for positions in clusters.values() if len(positions) > 1), key=lambda positions: positions[0])
+
+def report_near_duplicates(image_index, clusters, report_directory):
+    os.makedirs(report_directory, exist_ok=True)
+    near_duplicates_path = os.path.join(report_directory, "near_duplicates.csv")
+    with open(near_duplicates_path, 'w', newline='') as report_file:
+        csv_writer = csv.writer(report_file)
+        csv_writer.writerow(['cluster', 'archive', 'member', 'make', 'model', 'size', 'dhash', 'distance'])
+        for cluster_number, positions in enumerate(clusters, start=1):
+            reference_hash = int(image_index[positions[0]]['dhash'], 16)
+            print(f"Near-duplicate cluster {cluster_number} ({len(positions)} images):")
+            for position in positions:
+                image_record = image_index[position]
+                distance = get_hamming_distance(reference_hash, int(image_record['dhash'], 16))
+                print(f"    {os.path.basename(image_record['archive'])}: {image_record['member']} (distance {distance})")
+                csv_writer.writerow([cluster_number, os.path.basename(image_record['archive']), image_record['member'], image_record['make'],
+                                     image_record['model'], image_record['size'], image_record['dhash'], distance])
+    print(f"\nNear-duplicate clusters found: {len(clusters)}")
+    print(f"Near-duplicate report saved to: {near_duplicates_path}\n")
+
+def select_images(image_index, selected_makes=None, selected_models=None):
+    # Images without make and model cannot be sorted into a <make>_<model> folder
+    return [
+        image_record for image_record in image_index
+        if image_record['make'] and image_record['model']
+        and (not selected_makes or image_record['make'] in selected_makes)
+        and (not selected_models or image_record['model'] in selected_models)
+    ]
+
+def get_make_model_directory(report_directory, make, model):
+    return os.path.join(report_directory, f"{make}_{model}")
+
+def export_images(image_records, report_directory, report_writer, geocoder, hash_algorithms=('sha1',), exif_cache=None, executor=None, workers=1):
+    # Serve the export from the index, opening each archive once
+    images_by_archive = defaultdict(list)
+    for image_record in image_records:
+        images_by_archive[image_record['archive']].append(image_record)
+
+    reserved_paths = set()
+    verified_count = mismatched_count = 0
+    for zip_path, archive_images in images_by_archive.items():
+        # Destinations are chosen up front in index order so the output does not depend on worker scheduling
+        copy_jobs = []
+        for image_record in archive_images:
+            exif_datetime = image_record['datetime'] or image_record['datetime_original']
+            output_directory = get_make_model_directory(report_directory, image_record['make'], image_record['model'])
+            output_subdirectory = get_output_subdirectory(output_directory, exif_datetime)
+            new_image_path = get_unique_image_name(output_subdirectory, os.path.basename(image_record['member']), reserved_paths)
+            copy_jobs.append((image_record['member'], new_image_path, hash_algorithms))
+
+        image_digests = run_chunked(copy_members, zip_path, copy_jobs, executor, workers)
+        for image_record, digests in zip(archive_images, image_digests):
+            image_record['digests'] = digests
+            if 'sha1' in digests:
+                if image_record['sha1'] is None:
+                    image_record['sha1'] = digests['sha1']
+                    if exif_cache:
+                        exif_cache.store_hash(image_record, digests['sha1'])
+                elif image_record['sha1'] == digests['sha1']:
+                    verified_count += 1
+                else:
+                    # Chain of custody: the copy differs from what an earlier export of the same member hashed
+                    print(f"WARNING: SHA-1 mismatch for {image_record['member']} in {os.path.basename(zip_path)}: "
+                          f"recorded {image_record['sha1']}, copied {digests['sha1']}")
+                    mismatched_count += 1
+            report_image(image_record, report_writer, geocoder)
+        if exif_cache:
+            exif_cache.commit()
+
+    if verified_count or mismatched_count:
+        print(f"SHA-1 checked against earlier exports: {verified_count} matched, {mismatched_count} mismatched")
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Inspect EXIF camera make/model of images stored in ZIP archives.")
+    parser.add_argument('--workers', type=int, default=1, help="number of worker processes used to parse, hash and copy images (default: 1)")
+    parser.add_argument('--geocoder', choices=['nominatim', 'offline', 'none'], default='nominatim', help="reverse geocoding backend for GPS-tagged images (default: nominatim)")
+    parser.add_argument('--gazetteer', help="gazetteer file for the offline geocoder (GeoNames dump or name,latitude,longitude CSV)")
+    parser.add_argument('--geocode-precision', type=int, default=4, help="decimal places GPS coordinates are rounded to before geocoding (default: 4, about 11 m)")
+    parser.add_argument('--hash', default='sha1', help="comma-separated digests computed while copying images, e.g. sha1,sha256,md5; fixed-length digests only (default: sha1)")
+    parser.add_argument('--batch', action='store_true', help="export every make/model group in one run without prompting")
+    parser.add_argument('--make', action='append', help="in batch mode, only export this camera make (can be repeated)")
+    parser.add_argument('--model', action='append', help="in batch mode, only export this camera model (can be repeated)")
+    parser.add_argument('--report-format', choices=list(REPORT_EXTENSIONS), default='text', help="per-archive report format, written incrementally while images are processed (default: text)")
+    parser.add_argument('--near-duplicates', action='store_true', help="cluster resized/recompressed copies of the same photo using a perceptual hash")
+    parser.add_argument('--near-duplicate-distance', type=int, default=10, help="maximum differing bits (out of 64) for two images to count as near-duplicates (default: 10; larger values make the search slower)")
+    args = parser.parse_args()
+    if (args.make or args.model) and not args.batch:
+        parser.error("--make and --model filters require --batch")
+    args.hash = [algorithm.strip().lower() for algorithm in args.hash.split(',') if algorithm.strip()]
+    # Variable-length digests (shake_128, shake_256) have no fixed hexdigest() and are refused
+    unsupported_algorithms = [algorithm for algorithm in args.hash
+                              if algorithm not in hashlib.algorithms_guaranteed or hashlib.new(algorithm).digest_size == 0]
+    if unsupported_algorithms or not args.hash:
+        parser.error(f"unsupported --hash value: {', '.join(unsupported_algorithms) or args.hash}")
+    if args.geocoder == 'offline' and not args.gazetteer:
+        parser.error("--geocoder offline requires --gazetteer")
+    return args
+
+def main():
+    args = parse_arguments()
+    print("Android Camera Model Inspector")
+    print("Developed by Luca Cadonici")
+    print("This script inspects image files in a directory or ZIP archive and extracts EXIF metadata such as camera make, model, GPS information, and more.")
+    print("Required libraries: Pillow (PIL), piexif, geopy")
+    print("\n")
+    print("You can install the required libraries using the following commands:")
+    print("pip install Pillow piexif geopy\n")
+
+    exif_cache = ExifCache(os.path.join(current_directory, "exif_cache.db"))
+    evicted_archives = exif_cache.evict_missing_archives()
+    executor = ProcessPoolExecutor(max_workers=args.workers) if args.workers > 1 else None
+    image_index = build_exif_index(current_directory, exif_cache, executor, args.workers, args.near_duplicates)
+    print(f"EXIF cache: {exif_cache.hits} hits, {exif_cache.misses} misses, {evicted_archives} missing archives evicted\n")
+    geocoder = create_geocoder(args.geocoder, args.gazetteer, os.path.join(current_directory, "geocode_cache.db"), args.geocode_precision)
+    sorted_metadata = count_images_by_make_model(image_index)
+    report_directory = os.path.join(current_directory, "images_exif")
+
+    if args.near_duplicates:
+        clusters = find_near_duplicates(image_index, args.near_duplicate_distance)
+        report_near_duplicates(image_index, clusters, report_directory)
+
+    report_writer = ImageReportWriter(report_directory, args.report_format, args.hash)
+    if args.batch:
+        print_make_model_report(sorted_metadata)
+        selected_images = select_images(image_index, args.make, args.model)
+        print(f"\nExporting {len(selected_images)} images...\n")
+        export_images(selected_images, report_directory, report_writer, geocoder, args.hash, exif_cache, executor, args.workers)
+        print("Images have been copied to:", report_directory)
+    else:
         while True:
-            selected_make = input("\nEnter the camera make: ").strip()
-            if selected_make in valid_make_values:
+            print_make_model_report(sorted_metadata)
+            selected_make, selected_model = prompt_make_model(sorted_metadata)
+
+            output_directory = get_make_model_directory(report_directory, selected_make, selected_model)
+            os.makedirs(output_directory, exist_ok=True)
+            selected_images = select_images(image_index, [selected_make], [selected_model])
+            export_images(selected_images, report_directory, report_writer, geocoder, args.hash, exif_cache, executor, args.workers)
+            print("Images have been copied to:", output_directory)
+
+            # Ask user if they want to analyze another camera model
+            answer = input("Do you want to analyze another camera model? (yes/no): ").strip().lower()
+            while answer not in ["yes", "no"]:
+                print("Invalid input. Please enter 'yes' or 'no'.")
+                answer = input("Do you want to analyze another camera model? (yes/no): ").strip().lower()
+            if answer == "no":
+                print("Program closed.")
                 break
-            else:
-                print("Invalid Make value. Please enter a valid Make.")
 
-        while True:
-            selected_model = input("Enter the camera model: ").strip()
-            if selected_model in valid_model_values:
-                break
-            else:
-                print("Invalid Model value. Please enter a valid Model.")
-
-        output_directory = os.path.join(current_directory, "images_exif", f"{selected_make}_{selected_model}")
-        report_directory = os.path.join(current_directory, "images_exif")
-        os.makedirs(output_directory, exist_ok=True)
-
-
-        # Copy and process images
-        for filename in os.listdir(current_directory):
-            if filename.lower().endswith('.zip'):
-                zip_path = os.path.join(current_directory, filename)
-                image_files = find_image_files_in_zip(zip_path)
-
-                for image_file in image_files:
-                    image_path_in_zip_short = '/'.join(image_file.split('/')[1:])
-                    image_name = os.path.basename(image_file)
-                    image_path = os.path.join(temp_dir, image_file)
-                    
-                    if image_file.lower().endswith('.png'):
-                        exif_data = get_image_metadata_png(image_path)
-                    else:
-                        exif_data = get_image_metadata(image_path)
-                    
-                    if exif_data and 271 in exif_data and 272 in exif_data:
-                        make = exif_data.get(271, '').strip()
-                        model = exif_data.get(272, '').strip()
-                        if make == selected_make and model == selected_model:
-                            new_image_name = image_name
-                            count = 1
-                            while os.path.exists(os.path.join(output_directory, new_image_name)):
-                                    base_name, extension = os.path.splitext(image_name)
-                                    new_image_name = f"{base_name}_{count}{extension}"
-                                    count += 1
-                            new_image_path = os.path.join(output_directory, new_image_name)
-
-                            # Process and print EXIF data
-                            if image_file.lower().endswith('.png'):  
-                                def get_exif_data(image):
-                                        exif_data = image._getexif()
-                                        if exif_data is None:
-                                            return None
-                                        exif_info = {}
-                                        for tag, value in exif_data.items():
-                                            tag_name = TAGS.get(tag, tag)
-                                            exif_info[tag_name] = value
-                                        return exif_info
-                                def get_gps_info(exif_info):
-                                    if 'GPSInfo' in exif_info:
-                                        gps_info = {}
-                                        for tag, value in exif_info['GPSInfo'].items():
-                                            tag_name = GPSTAGS.get(tag, tag)
-                                            gps_info[tag_name] = value
-                                        return gps_info
-                                    return None
-                                image = Image.open(image_path)
-                                exif_info = get_exif_data(image)
-                                
-      
-                                            
-                                
-                                if exif_info is not None:
-                                    exif_datetime = None  # Initialize the variable
-                                    for key, value in exif_info.items():
-                                     if key == "DateTimeOriginal":
-                                        exif_datetime = value
-                                        print(f"Exif date: {value}")
-                                        gps_info = get_gps_info(exif_info)
-                                        if gps_info is not None:
-                                            latitude = get_decimal_from_dms(gps_info.get('GPSLatitude', (0, 0, 0)), gps_info.get('GPSLatitudeRef', 'N'))
-                                            longitude = get_decimal_from_dms(gps_info.get('GPSLongitude', (0, 0, 0)), gps_info.get('GPSLongitudeRef', 'E'))
-                                            altitude = gps_info.get('GPSAltitude', None)
-                                            print("Image path:", image_file)                                                                                       
-                                            if altitude is not None:
-                                                print(f"Altitude: {altitude} meters")
-                                            latitude_string = str(latitude)
-                                            longitude_string = str(longitude)
-                                            numerator_str, denominator_str = latitude_string.split('/')
-                                            numerator = int(numerator_str)
-                                            denominator = int(denominator_str)
-                                            result = numerator / denominator
-                                            print("Latitude:", result)
-                                            numerator_str, denominator_str = longitude_string.split('/')
-                                            numerator = int(numerator_str)
-                                            denominator = int(denominator_str)
-                                            result = numerator / denominator
-                                            print("Longitude:", result)
-                                            address = get_address_from_gps_nominatim(latitude, longitude)
-                                            print("Address:", address)
-                                            with open(image_path, 'rb') as img_file:
-                                                    image_content = img_file.read()
-                                                    image_hash = hashlib.sha1(image_content).hexdigest()
-                                                    print("SHA-1 Hash:", image_hash)
-                                            print("=" * 60)
-
-                            else:
-                                exif_dict = piexif.load(image_path)  # Use the function piexif.load
-                                exif_make = exif_dict["0th"].get(piexif.ImageIFD.Make, b"Unknown").decode("utf-8")
-                                exif_model = exif_dict["0th"].get(piexif.ImageIFD.Model, b"Unknown").decode("utf-8")
-                                exif_datetime = exif_dict["0th"].get(piexif.ImageIFD.DateTime, b"Unknown").decode("utf-8")
-                                gps_data = exif_dict.get("GPS", {})
-                                gps_altitude = gps_data.get(piexif.GPSIFD.GPSAltitude, (0, 0))
-                                gps_latitude = gps_data.get(piexif.GPSIFD.GPSLatitude, [])
-                                gps_longitude = gps_data.get(piexif.GPSIFD.GPSLongitude, [])
-                                if gps_altitude and len(gps_altitude) >= 2 and gps_altitude[1] != 0:
-                                    numerator, denominator = gps_altitude
-                                    altitude = numerator / denominator
-                                    gps_altitude_ref = gps_data.get(piexif.GPSIFD.GPSAltitudeRef, 0)
-                                    if gps_altitude_ref == 1:
-                                        altitude = -altitude
-                                    altitude_in_meters = altitude if gps_altitude_ref == 0 else -altitude
-                                else:
-                                        altitude_in_meters = 0
-
-                                if len(gps_latitude) >= 3 and len(gps_longitude) >= 3:
-                                        latitude = convert_coordinate(gps_latitude[0][0], gps_latitude[1][0], gps_latitude[2][0], gps_data.get(piexif.GPSIFD.GPSLatitudeRef, b'N'))
-                                        longitude = convert_coordinate(gps_longitude[0][0], gps_longitude[1][0], gps_longitude[2][0], gps_data.get(piexif.GPSIFD.GPSLongitudeRef, b'E'))
-                                        address = get_address_from_gps_nominatim(latitude, longitude)
-                                        print("Image path:", image_path_in_zip_short)
-                                        print("Exif date:", exif_datetime)
-                                        print("Exif GPS Latitude:", latitude)
-                                        print("Exif GPS Longitude:", longitude)
-                                        print("Address:", address)
-                                        with open(image_path, 'rb') as img_file:
-                                                    image_content = img_file.read()
-                                                    image_hash = hashlib.sha1(image_content).hexdigest()
-                                                    print("SHA-1 Hash:", image_hash)
-                                        print("=" * 60)                               
-                                else:
-                                        print("Image:", image_path_in_zip_short)
-                                        print("Exif date:", exif_datetime)
-                                        print("Exif GPS Altitude: Not available")
-                                        print("Exif GPS Latitude: Not available")
-                                        print("Exif GPS Longitude: Not available")
-                                        #Calculate the SHA-1 hash of the image content
-                                        with open(image_path, 'rb') as img_file:
-                                                   image_content = img_file.read()
-                                                   image_hash = hashlib.sha1(image_content).hexdigest()
-                                                   print("SHA-1 Hash:", image_hash)
-                                        print("=" * 60)
-
-
-                            # Create subdirectory with EXIF DateTime name
-                            if exif_datetime:
-                                exif_datetime_obj = datetime.strptime(exif_datetime, "%Y:%m:%d %H:%M:%S")
-                                subfolder_name = exif_datetime_obj.strftime("%Y-%m-%d")
-                                output_subdirectory = os.path.join(output_directory, subfolder_name)
-                                os.makedirs(output_subdirectory, exist_ok=True)
-                            elif DateTimeOriginal:
-                                exif_datetime_obj = datetime.strptime(DateTimeOriginal, "%Y:%m:%d %H:%M:%S")
-                                subfolder_name = exif_datetime_obj.strftime("%Y-%m-%d")
-                                output_subdirectory = os.path.join(output_directory, subfolder_name)
-                                os.makedirs(output_subdirectory, exist_ok=True)
-
-                            # Copy image to subdirectory
-                            new_image_path = os.path.join(output_subdirectory, new_image_name)
-                            #shutil.copy(image_path, new_image_path)
-                            new_image_name = image_name
-                            count = 1
-                            while os.path.exists(os.path.join(output_subdirectory, new_image_name)):
-                                base_name, extension = os.path.splitext(image_name)
-                                new_image_name = f"{base_name}_{count}{extension}"
-                                count += 1
-
-                            # Copy image to subdirectory
-                            new_image_path = os.path.join(output_subdirectory, new_image_name)
-                            shutil.copy(image_path, new_image_path)
-                            all_images_report.append(f"Image path: {image_path_in_zip_short}")                          
-                            all_images_report.append(f"Exif date: {exif_datetime}")
-
-
-                            if latitude is not None:
-                                all_images_report.append(f"Exif GPS Latitude: {latitude}")
-                            else:
-                                all_images_report.append(f"Exif GPS Latitude: None")
-                            if longitude is not None:
-                                all_images_report.append(f"Exif GPS Longitude: {longitude}")
-                            else:
-                                all_images_report.append(f"Exif GPS Longitude: None")
-                            if address is not None:
-                                all_images_report.append(f"Address: {address}")
-                            else:
-                                all_images_report.append(f"Address: None")
-
-                            all_images_report.append(f"SHA-1 Hash: {image_hash}")
-                            all_images_report.append("=" * 60)
-
-                            
-                            
-
-        print("Images have been copied to:", output_directory)
-
-    # Ask user if they want to analyze another camera model
-    repeat = input("Do you want to analyze another camera model? (yes/no): ").strip().lower()
-    while repeat not in ["yes", "no"]:
-        print("Invalid input. Please enter 'yes' or 'no'.")
-        repeat = input("Do you want to analyze another camera model? (yes/no): ").strip().lower()
-    if repeat == "no":
-        print("Program closed.")
-        break
-
-# Save the all_images_report to report.txt
-all_images_report_path = os.path.join(report_directory, f"{zip_name}_exif_image_report.txt")
-with open(all_images_report_path, 'w') as report_file:
-    report_file.write("\n".join(all_images_report))
+    if executor:
+        executor.shutdown()
+    close_open_archives()
+    exif_cache.close()
+    geocoder.close()
+    print(f"Geocoding cache: {geocoder.hits} hits, {geocoder.misses} misses")
+    report_writer.close()
+
+if __name__ == '__main__':
+    main()
@@ -1,34 +1,37 @@
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import csv
+import json
 import os
-import zipfile
+import re
+import sys
 import sqlite3
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from android_common.archive_databases import open_archive
+from android_common.artifact_catalog import CONTACTS_DATABASE, WA_DATABASE, is_archive_file
+from android_common.phone_numbers import PhoneNumberIndex, canonicalize_number
+from android_common.query_stream import stream_query
+from android_common.sqlite_connections import enable_query_plan_logging
+
 # Get the current directory where the script is executed
 current_directory = os.getcwd()
 
-# Initialize zip_filename as None
-zip_filename = None
-
-# Introductory messages
-print("Android Contacts Analyzer v. 1.1")
-print("\n")
-print("Developed by: Luca Cadonici")
-print("This script searches for 'contacts2.db' and 'wa.db' databases within ZIP or TAR files in the script's folder.")
-print("It allows you to search for contacts based on WhatsApp name, display name, or phone number and returns the result in basic or extended form, including additional information such as the contact's last modification date.")
-print("To exit the script, press 'q' when prompted.")
-print("\n")
-# Print ZIP file information at the beginning
-for filename in os.listdir(current_directory):
-    if filename.endswith(".zip"):
-        print(f"ZIP file found: {filename}")
-        print("\n")
-        zip_filename = filename  # Store the ZIP filename for later use
-        break
-
-# Initialize a dictionary to store associations between phone numbers and contact information
-phone_number_to_contact_info = {}
+# The artifact catalog finds contacts2.db under every contacts provider variant and user profile; of the
+# cataloged wa.db files only WhatsApp's own (and WhatsApp Business') are read
+WA_DATABASE_PATTERN = re.compile(r'(^|/)com\.whatsapp(\.w4b)?/databases/wa\.db$')
+USER_PROFILE_PATTERN = re.compile(r'(^|/)data/user(_de)?/(\d+)/')
+
+# Trigram full-text index over the merged contacts; shorter terms fall back to LIKE on the same table
+TRIGRAM_MIN_LENGTH = 3
+
+# Columns of the batch search output, one row per (term, contact) match
+BATCH_RESULT_FIELDS = ('term', 'term_type', 'display_name', 'phone_number', 'last_updated_timestamp', 'whatsapp_name', 'status', 'status_timestamp', 'jid', 'source', 'device')
+BATCH_RESULT_FORMATS = ('csv', 'jsonl')
 
 # Function to print basic contact information
 def print_basic_contact_info(contact_info):
+    print("Device:", contact_info['device'])
     print("Display Name:", contact_info['display_name'])
     print("Phone Number:", contact_info['phone_number'])
     print("WhatsApp Name:", contact_info['whatsapp_name'])
@@ -36,6 +39,7 @@ def print_basic_contact_info(contact_info):
 
 # Function to print complete contact information
 def print_complete_contact_info(contact_info, last_updated_timestamp):
+    print("Device:", contact_info['device'])
     print("Display Name:", contact_info['display_name'])
     print("Phone Number:", contact_info['phone_number'])
     print("WhatsApp Name:", contact_info['whatsapp_name'])
@@ -44,24 +48,28 @@ def print_complete_contact_info(contact_info, last_updated_timestamp):
     print("WhatsApp Status Timestamp:", contact_info['status_timestamp'])
     print("----------------------")
 
-# Function to search for "contacts2.db" files in a ZIP archive and update the phone_number_to_contact_info dictionary
-def search_for_contacts2_db_in_zip(zip_filename, normalized_term):
-    with zipfile.ZipFile(zip_filename, 'r') as zip_ref:
-        for file_info in zip_ref.infolist():
-            if 'data/data/com.Android.providers.contacts/databases/' in file_info.filename or 'data/data/com.samsung.android.providers.contacts/databases/' in file_info.filename:
-                if file_info.filename.endswith("contacts2.db"):
-                    # Extract the 'contacts2.db' file to the current directory
-                    zip_ref.extract(file_info, current_directory)
-                    db_filename = os.path.join(current_directory, file_info.filename)
-                    # Update the phone_number_to_contact_info dictionary with contact information from 'contacts2.db'
-                    update_phone_number_to_contact_info(db_filename, normalized_term)
-
-# Function to update the phone_number_to_contact_info dictionary with contact information from 'contacts2.db'
-def update_phone_number_to_contact_info(db_filename, normalized_term):
+# Function to find the first ZIP (or TAR) file in the script's folder
+def find_zip_file(directory):
+    for filename in os.listdir(directory):
+        if is_archive_file(filename):
+            return filename
+    return None
+
+# Function to find every ZIP (or TAR) file in the script's folder, one per device
+def find_zip_files(directory):
+    return sorted(filename for filename in os.listdir(directory) if is_archive_file(filename))
+
+# Function to name the device a database belongs to: the archive, plus the Android user for secondary profiles
+def get_device_name(zip_filename, member_name):
+    profile_match = USER_PROFILE_PATTERN.search(member_name)
+    if profile_match and profile_match.group(3) != '0':
+        return f"{os.path.basename(zip_filename)} (user {profile_match.group(3)})"
+    return os.path.basename(zip_filename)
+
+# Function to read every contact with a phone number from 'contacts2.db'
+def load_contacts2_rows(archive, member_name):
     try:
-        conn = sqlite3.connect(db_filename)
-        cursor = conn.cursor()
-        cursor.execute(f"""
+        return list(stream_query(archive.open_database(member_name), """
             SELECT DISTINCT
                 raw_contacts.display_name AS 'Display Name',
                 phone_lookup.normalized_number AS 'Phone Number',
@@ -69,48 +77,16 @@ def update_phone_number_to_contact_info(db_filename, normalized_term):
             FROM raw_contacts
             INNER JOIN phone_lookup ON raw_contacts._id = phone_lookup.raw_contact_id
             INNER JOIN contacts ON raw_contacts._id = contacts.name_raw_contact_id
-            WHERE
-                raw_contacts.display_name LIKE '%{normalized_term}%'
-                OR phone_lookup.normalized_number LIKE '%{normalized_term}%'
-        """)
-        rows = cursor.fetchall()
-        if rows:
-            for row in rows:
-                contact_info = {
-                    'display_name': row[0],
-                    'phone_number': row[1],
-                    'last_updated_timestamp': row[2],  # Assuming it's in the third column of the query
-                    'whatsapp_name': None,  # Placeholder for WhatsApp Name
-                    'status': None,  # Placeholder for WhatsApp Status
-                    'status_timestamp': None,  # Placeholder for WhatsApp Status Timestamp
-                    'jid': None  # Placeholder for WhatsApp JID
-                }
-                phone_number_to_contact_info[row[1]] = contact_info
-        else:
-            print("No results found for the entered term in 'contacts2.db'.")
+        """))
     except sqlite3.Error as e:
-        print(f"Error opening the database '{db_filename}': {e}")
-    finally:
-        conn.close()
-
-# Function to search for "wa.db" files in a ZIP archive and update the phone_number_to_contact_info dictionary
-def search_for_wa_db_in_zip(zip_filename, normalized_term):
-    with zipfile.ZipFile(zip_filename, 'r') as zip_ref:
-        for file_info in zip_ref.infolist():
-            if 'data/data/com.whatsapp/databases/' in file_info.filename and file_info.filename.endswith("wa.db"):
-                # Extract the 'wa.db' file to the current directory
-                zip_ref.extract(file_info, current_directory)
-                db_filename = os.path.join(current_directory, file_info.filename)
-                # Update the phone_number_to_contact_info dictionary with WhatsApp information from 'wa.db'
-                update_phone_number_to_contact_info_from_wa_db(db_filename, normalized_term)
-
-# Function to update the phone_number_to_contact_info dictionary with WhatsApp information from 'wa.db'
-def update_phone_number_to_contact_info_from_wa_db(db_filename, normalized_term):
+        print(f"Error opening the database '{member_name}': {e}")
+        return []
+
+# Function to read every contact from 'wa.db'
+def load_wa_rows(archive, member_name):
     try:
-        conn = sqlite3.connect(db_filename)
-        cursor = conn.cursor()
-        cursor.execute(f"""
-            SELECT 
+        return list(stream_query(archive.open_database(member_name), """
+            SELECT
                 CASE
                     WHEN number IS NULL THEN
                         SUBSTR(jid, 1, INSTR(jid, '@s.whatsapp.net') - 1)
@@ -126,52 +102,348 @@ def update_phone_number_to_contact_info_from_wa_db(db_filename, normalized_term)
                 END AS "Status Timestamp",
                 jid
             FROM wa_contacts
-            WHERE 
-                lower(wa_name) LIKE '%{normalized_term}%'
-                OR lower(display_name) LIKE '%{normalized_term}%'
-                OR replace(number, ' ', '') LIKE '%{normalized_term}%'
+        """))
+    except sqlite3.Error as e:
+        print(f"Error opening the database '{member_name}': {e}")
+        return []
+
+# Function to read the contacts of one archive, grouped by device: returns [(device, contacts2_rows, wa_rows), ...]
+# Runs in a worker process in multi-device mode, so it opens and closes the archive itself
+def load_device_contacts(zip_filename):
+    archive = open_archive(zip_filename)
+    rows_by_device = {}
+    for member_name in archive.catalog.get_member_names(CONTACTS_DATABASE):
+        device_rows = rows_by_device.setdefault(get_device_name(zip_filename, member_name), ([], []))
+        device_rows[0].extend(load_contacts2_rows(archive, member_name))
+    for member_name in archive.catalog.get_member_names(WA_DATABASE):
+        if not WA_DATABASE_PATTERN.search(member_name):
+            continue
+        device_rows = rows_by_device.setdefault(get_device_name(zip_filename, member_name), ([], []))
+        device_rows[1].extend(load_wa_rows(archive, member_name))
+    archive.close()
+    return [(device, contacts2_rows, wa_rows) for device, (contacts2_rows, wa_rows) in sorted(rows_by_device.items())]
+
+def get_number_digits(phone_number):
+    return re.sub(r'\D', '', phone_number or '')
+
+def is_number_term(term):
+    return bool(re.fullmatch(r'[\d\s+()\-./]+', term)) and any(character.isdigit() for character in term)
+
+def get_fts_phrase(text):
+    return '"' + text.replace('"', '""') + '"'
+
+def get_like_pattern(text):
+    return '%' + text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+# Function to read the search terms of a batch file: one term per line, blank lines and '#' comments skipped
+def load_search_terms(terms_filename):
+    search_terms = []
+    with open(terms_filename, encoding='utf-8-sig') as terms_file:
+        for line in terms_file:
+            term = line.strip()
+            if term and not term.startswith('#'):
+                search_terms.append(term)
+    return search_terms
+
+def row_to_contact_info(row):
+    return {
+        'display_name': row[0],
+        'phone_number': row[1],
+        'last_updated_timestamp': row[2],
+        'whatsapp_name': row[3],
+        'status': row[4],
+        'status_timestamp': row[5],
+        'jid': row[6],
+        'device': row[7],
+    }
+
+class ContactsIndex:
+    # contacts2.db and wa.db of every device merged once per session into an in-memory table with a trigram
+    # full-text index for names and a reversed-digit suffix index for phone numbers
+    SELECT_COLUMNS = "SELECT display_name, phone_number, last_updated_timestamp, whatsapp_name, status, status_timestamp, jid, device FROM contacts_index"
+
+    def __init__(self, device_contacts):
+        self.conn = sqlite3.connect(':memory:')
+        self.conn.execute("""
+            CREATE TABLE contacts_index (
+                id INTEGER PRIMARY KEY,
+                display_name TEXT,
+                phone_number TEXT,
+                last_updated_timestamp TEXT,
+                whatsapp_name TEXT,
+                wa_display_name TEXT,
+                status TEXT,
+                status_timestamp TEXT,
+                jid TEXT,
+                canonical_number TEXT,
+                source TEXT,
+                device TEXT
+            )
         """)
-        rows = cursor.fetchall()
-        if rows:
-            for row in rows:
-                phone_number = row[0]
-                if phone_number in phone_number_to_contact_info:
-                    # Update the existing contact_info with WhatsApp information
-                    contact_info = phone_number_to_contact_info[phone_number]
-                    contact_info['whatsapp_name'] = row[2]
-                    contact_info['status'] = row[3]
-                    contact_info['status_timestamp'] = row[4]
-                    contact_info['jid'] = row[5]
+        # contacts2.db and wa.db are only joined within the same device
+        index_rows = []
+        for device, contacts2_rows, wa_rows in device_contacts:
+            index_rows.extend(index_row + (device,) for index_row in self.merge_contacts(contacts2_rows, wa_rows))
+        self.conn.executemany("""
+            INSERT INTO contacts_index (display_name, phone_number, last_updated_timestamp, whatsapp_name, wa_display_name, status, status_timestamp, jid, canonical_number, source, device)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, index_rows)
+
+        self.number_index = PhoneNumberIndex()
+        for row_id, index_row in enumerate(index_rows, start=1):
+            self.number_index.add(index_row[8], row_id)
+
+        try:
+            self.conn.execute("""
+                CREATE VIRTUAL TABLE contacts_fts USING fts5(
+                    display_name, whatsapp_name, wa_display_name, canonical_number,
+                    content='contacts_index', content_rowid='id', tokenize='trigram'
+                )
+            """)
+            self.conn.execute("INSERT INTO contacts_fts(contacts_fts) VALUES ('rebuild')")
+            self.has_fts = True
+        except sqlite3.OperationalError:
+            # SQLite builds without FTS5/trigram (< 3.34) still get the in-memory table
+            self.has_fts = False
+        self.conn.commit()
+
+    @staticmethod
+    def merge_contacts(contacts2_rows, wa_rows):
+        # Same number, same entry: the last contacts2.db row for a number wins, as in the per-search version
+        contacts_by_number = {}
+        for display_name, phone_number, last_updated_timestamp in contacts2_rows:
+            contacts_by_number[phone_number] = (display_name, last_updated_timestamp)
+
+        # contacts2.db stores '+39333...', wa.db '39333...@s.whatsapp.net' or '+39 333 ...':
+        # both sides are joined on the canonical number, with or without country prefix
+        wa_number_index = PhoneNumberIndex()
+        for wa_row in wa_rows:
+            wa_number_index.add(wa_row[5] or wa_row[0], wa_row)
+
+        index_rows = []
+        matched_wa_rows = set()
+        for phone_number, (display_name, last_updated_timestamp) in contacts_by_number.items():
+            canonical_number = canonicalize_number(phone_number)
+            wa_matches = wa_number_index.match(phone_number)
+            if wa_matches:
+                wa_row = wa_matches[0]
+                matched_wa_rows.add(id(wa_row))
+                _, wa_display_name, whatsapp_name, status, status_timestamp, jid = wa_row
+                index_rows.append((display_name, phone_number, last_updated_timestamp, whatsapp_name, wa_display_name, status, status_timestamp, jid, canonical_number, 'contacts2.db+wa.db'))
+            else:
+                index_rows.append((display_name, phone_number, last_updated_timestamp, None, None, None, None, None, canonical_number, 'contacts2.db'))
+
+        # WhatsApp contacts without an address book entry are searchable too
+        for wa_row in wa_rows:
+            canonical_number = canonicalize_number(wa_row[5] or wa_row[0])
+            if canonical_number and id(wa_row) not in matched_wa_rows:
+                phone_number, wa_display_name, whatsapp_name, status, status_timestamp, jid = wa_row
+                index_rows.append((wa_display_name, phone_number, None, whatsapp_name, wa_display_name, status, status_timestamp, jid, canonical_number, 'wa.db'))
+        return index_rows
+
+    def fetch_rows(self, row_ids):
+        rows = []
+        for row_id in sorted(row_ids):
+            rows.append(self.conn.execute(f"{self.SELECT_COLUMNS} WHERE id = ?", (row_id,)).fetchone())
+        return rows
+
+    def find_number_ids(self, search_term):
+        # Every number containing the digits, as before, plus full numbers written with or without the
+        # country prefix (a stored number the term ends with)
+        row_ids = set(self.number_index.match(search_term))
+        number_digits = get_number_digits(search_term)
+        if self.has_fts and len(number_digits) >= TRIGRAM_MIN_LENGTH:
+            row_ids.update(row_id for (row_id,) in self.conn.execute("SELECT rowid FROM contacts_fts WHERE contacts_fts MATCH ?",
+                                                                      ('canonical_number : ' + get_fts_phrase(number_digits),)))
         else:
-            print("No results found for the entered term in 'wa.db'.")
-    except sqlite3.Error as e:
-        print(f"Error opening the database '{db_filename}': {e}")
-    finally:
-        conn.close()
+            row_ids.update(row_id for (row_id,) in self.conn.execute("SELECT id FROM contacts_index WHERE instr(canonical_number, ?) > 0", (number_digits,)))
+        return row_ids
+
+    def search(self, search_term):
+        search_term = search_term.strip()
+        if is_number_term(search_term):
+            rows = self.fetch_rows(self.find_number_ids(search_term))
+        elif self.has_fts and len(search_term) >= TRIGRAM_MIN_LENGTH:
+            rows = self.conn.execute(f"{self.SELECT_COLUMNS} WHERE id IN (SELECT rowid FROM contacts_fts WHERE contacts_fts MATCH ?) ORDER BY id",
+                                     (get_fts_phrase(search_term),)).fetchall()
+        else:
+            like_pattern = get_like_pattern(search_term)
+            rows = self.conn.execute(f"""{self.SELECT_COLUMNS}
+                WHERE display_name LIKE ? ESCAPE '\\' OR whatsapp_name LIKE ? ESCAPE '\\' OR wa_display_name LIKE ? ESCAPE '\\' OR phone_number LIKE ? ESCAPE '\\'
+                ORDER BY id""", (like_pattern,) * 4).fetchall()
+        return [row_to_contact_info(row) for row in rows]
+
+    def batch_search(self, search_terms):
+        # Every term is loaded into a temp table and resolved by set-based joins against the index;
+        # yields (term, term_type, row) in term order, streamed from the cursor
+        self.conn.execute("DROP TABLE IF EXISTS temp.search_terms")
+        self.conn.execute("DROP TABLE IF EXISTS temp.number_matches")
+        self.conn.execute("CREATE TEMP TABLE search_terms (term_id INTEGER PRIMARY KEY, term TEXT, term_type TEXT, fts_query TEXT, like_pattern TEXT, number_digits TEXT)")
+        self.conn.execute("CREATE TEMP TABLE number_matches (term_id INTEGER, contact_id INTEGER)")
+
+        term_rows = []
+        number_match_rows = []
+        for term_id, search_term in enumerate(search_terms, start=1):
+            search_term = search_term.strip()
+            fts_query = like_pattern = number_digits = None
+            if is_number_term(search_term):
+                term_type = 'number'
+                # Same resolution as an interactive search: the digits anywhere in the canonical number (trigram
+                # phrase, or instr() for short terms) joined below, plus the number index's prefix-insensitive matches
+                number_match_rows.extend((term_id, contact_id) for contact_id in self.number_index.match(search_term))
+                if self.has_fts and len(get_number_digits(search_term)) >= TRIGRAM_MIN_LENGTH:
+                    fts_query = 'canonical_number : ' + get_fts_phrase(get_number_digits(search_term))
+                else:
+                    number_digits = get_number_digits(search_term)
+            else:
+                term_type = 'name'
+                if self.has_fts and len(search_term) >= TRIGRAM_MIN_LENGTH:
+                    fts_query = get_fts_phrase(search_term)
+                else:
+                    like_pattern = get_like_pattern(search_term)
+            term_rows.append((term_id, search_term, term_type, fts_query, like_pattern, number_digits))
+        self.conn.executemany("INSERT INTO search_terms VALUES (?, ?, ?, ?, ?, ?)", term_rows)
+        self.conn.executemany("INSERT INTO number_matches VALUES (?, ?)", number_match_rows)
+
+        contact_columns = "c.display_name, c.phone_number, c.last_updated_timestamp, c.whatsapp_name, c.status, c.status_timestamp, c.jid, c.source, c.device"
+        queries = [f"""
+            SELECT t.term_id, c.id, t.term, t.term_type, {contact_columns}
+            FROM number_matches m
+            JOIN search_terms t ON t.term_id = m.term_id
+            JOIN contacts_index c ON c.id = m.contact_id
+        """, f"""
+            SELECT t.term_id, c.id, t.term, t.term_type, {contact_columns}
+            FROM search_terms t
+            JOIN contacts_index c ON c.display_name LIKE t.like_pattern ESCAPE '\\' OR c.whatsapp_name LIKE t.like_pattern ESCAPE '\\'
+                OR c.wa_display_name LIKE t.like_pattern ESCAPE '\\' OR c.phone_number LIKE t.like_pattern ESCAPE '\\'
+            WHERE t.like_pattern IS NOT NULL
+        """, f"""
+            SELECT t.term_id, c.id, t.term, t.term_type, {contact_columns}
+            FROM search_terms t
+            JOIN contacts_index c ON instr(c.canonical_number, t.number_digits) > 0
+            WHERE t.number_digits IS NOT NULL
+        """]
+        if self.has_fts:
+            queries.append(f"""
+                SELECT t.term_id, c.id, t.term, t.term_type, {contact_columns}
+                FROM search_terms t
+                JOIN contacts_fts f ON f.contacts_fts MATCH t.fts_query
+                JOIN contacts_index c ON c.id = f.rowid
+                WHERE t.fts_query IS NOT NULL
+            """)
+        # UNION: a contact found both by the number index and by the digit search is reported once per term
+        cursor = self.conn.execute(" UNION ".join(queries) + " ORDER BY 1, 2")
+        for row in cursor:
+            yield row[2], row[3], row[4:]
+
+    def close(self):
+        self.conn.close()
+
+# Function to stream batch search results to a CSV or JSONL file, returning the matched rows and terms
+def write_batch_results(batch_results, output_filename, output_format):
+    result_count = 0
+    matched_terms = set()
+    with open(output_filename, 'w', newline='', encoding='utf-8') as output_file:
+        if output_format == 'csv':
+            csv_writer = csv.writer(output_file)
+            csv_writer.writerow(BATCH_RESULT_FIELDS)
+        for term, term_type, row in batch_results:
+            if output_format == 'csv':
+                csv_writer.writerow((term, term_type) + tuple(row))
+            else:
+                output_file.write(json.dumps(dict(zip(BATCH_RESULT_FIELDS, (term, term_type) + tuple(row))), ensure_ascii=False) + '\n')
+            result_count += 1
+            matched_terms.add(term)
+    return result_count, matched_terms
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Search contacts2.db and wa.db inside Android extraction ZIP or TAR archives.")
+    parser.add_argument('--all-archives', action='store_true', help="search every ZIP or TAR in the folder (one per device) instead of the first one found")
+    parser.add_argument('--workers', type=int, default=1, help="number of worker processes reading the archives in --all-archives mode (default: 1)")
+    parser.add_argument('--batch', metavar='TERMS_FILE', help="resolve every term in this file (one per line) instead of searching interactively")
+    parser.add_argument('--output', help="batch results file (default: contacts_batch_results.<format> in the current directory)")
+    parser.add_argument('--format', choices=BATCH_RESULT_FORMATS, help="batch results format (default: from the --output extension, otherwise csv)")
+    parser.add_argument('--explain-queries', action='store_true', help="log EXPLAIN QUERY PLAN for each database query to standard error, flagging full table scans")
+    args = parser.parse_args()
+    if args.explain_queries:
+        enable_query_plan_logging()
+    if (args.output or args.format) and not args.batch:
+        parser.error("--output and --format require --batch")
+    if args.format is None:
+        args.format = 'jsonl' if args.output and args.output.lower().endswith('.jsonl') else 'csv'
+    if args.output is None:
+        args.output = os.path.join(current_directory, f"contacts_batch_results.{args.format}")
+    return args
+
+def main():
+    args = parse_arguments()
+
+    # Introductory messages
+    print("Android Contacts Analyzer v. 1.1")
+    print("\n")
+    print("Developed by: Luca Cadonici")
+    print("This script searches for 'contacts2.db' and 'wa.db' databases within ZIP or TAR files in the script's folder.")
+    print("It allows you to search for contacts based on WhatsApp name, display name, or phone number and returns the result in basic or extended form, including additional information such as the contact's last modification date.")
+    print("To exit the script, press 'q' when prompted.")
+    print("\n")
+
+    # Print ZIP file information at the beginning
+    if args.all_archives:
+        zip_filenames = find_zip_files(current_directory)
+    else:
+        zip_filename = find_zip_file(current_directory)
+        zip_filenames = [zip_filename] if zip_filename else []
+    if not zip_filenames:
+        print("No ZIP file found in the script's folder.")
+        return
+    for zip_filename in zip_filenames:
+        print(f"ZIP file found: {zip_filename}")
+    print("\n")
 
+    # Read the databases straight from the ZIPs, one archive per worker, and build the session index once
+    if args.workers > 1 and len(zip_filenames) > 1:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            archive_contacts = list(executor.map(load_device_contacts, zip_filenames))
+    else:
+        archive_contacts = [load_device_contacts(zip_filename) for zip_filename in zip_filenames]
+    device_contacts = [contacts for device_list in archive_contacts for contacts in device_list]
+    contacts_index = ContactsIndex(device_contacts)
+    for device, contacts2_rows, wa_rows in device_contacts:
+        print(f"Contacts indexed from {device}: {len(contacts2_rows)} rows from 'contacts2.db', {len(wa_rows)} rows from 'wa.db'.")
+    print("\n")
 
-# Continuous search loop
-while True:
-    normalized_term = input("Enter a number or one or more words to search (press 'q' to exit): ")
-    if normalized_term.lower() == 'q':
-        break
+    if args.batch:
+        search_terms = load_search_terms(args.batch)
+        print(f"Resolving {len(search_terms)} search terms from '{args.batch}'...")
+        result_count, matched_terms = write_batch_results(contacts_index.batch_search(search_terms), args.output, args.format)
+        print(f"Matches found: {result_count} for {len(matched_terms)} of {len(set(search_terms))} terms.")
+        print("Batch results saved to:", args.output)
+        contacts_index.close()
+        return
 
-    # Search for contact information in 'contacts2.db'
-    search_for_contacts2_db_in_zip(zip_filename, normalized_term)
+    # Continuous search loop
+    while True:
+        normalized_term = input("Enter a number or one or more words to search (press 'q' to exit): ")
+        if normalized_term.lower() == 'q':
+            break
 
-    # Search for contact information in 'wa.db'
-    search_for_wa_db_in_zip(zip_filename, normalized_term)
+        contacts_found = contacts_index.search(normalized_term)
+        if not contacts_found:
+            print("No results found for the entered term.")
+            continue
 
-    # Print basic contact information
-    for phone_number, contact_info in phone_number_to_contact_info.items():
-        print_basic_contact_info(contact_info)
+        # Print basic contact information
+        for contact_info in contacts_found:
+            print_basic_contact_info(contact_info)
 
-    # Ask the user if they want to see complete information
-    show_complete_info = input("Do you want to see complete information? (yes/no): ").strip().lower()
-    if show_complete_info == 'yes':
-        for phone_number, contact_info in phone_number_to_contact_info.items():
-            # Include the last_updated_timestamp argument here
-            print_complete_contact_info(contact_info, contact_info['last_updated_timestamp'])
+        # Ask the user if they want to see complete information
+        show_complete_info = input("Do you want to see complete information? (yes/no): ").strip().lower()
+        if show_complete_info == 'yes':
+            for contact_info in contacts_found:
+                # Include the last_updated_timestamp argument here
+                print_complete_contact_info(contact_info, contact_info['last_updated_timestamp'])
 
-    phone_number_to_contact_info.clear()  # Clear the dictionary for the next search
+    contacts_index.close()
 
+if __name__ == '__main__':
+    main()
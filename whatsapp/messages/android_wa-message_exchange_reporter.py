@@ -1,18 +1,182 @@
 #WhatsApp Message Exchange Reporter
 # This script generates a report of phone numbers involved in WhatsApp message exchanges. The report includes details such as the display name (if available), phone number, message count, and raw string associated with the contact. The script first connects to the 'msgstore.db' and 'wa.db' SQLite databases, which are commonly used by WhatsApp. It then retrieves information from these databases and sorts the results based on message count and display name.
 
+import argparse
+import csv
+import hashlib
+import os
 import sqlite3
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from android_common.archive_databases import close_archives, open_database
+from android_common.artifact_catalog import load_catalog
+from android_common.query_stream import stream_query
+from android_common.sqlite_connections import enable_query_plan_logging
+
+# Number of messages in (watermark, new watermark]: a rowid range count over 'message', without joins
+MESSAGE_COUNT_QUERY = "SELECT COUNT(*) FROM message WHERE _id > ? AND _id <= ?"
+
+# Function to fingerprint the part of 'message' already merged into the stats store: the table schema, the first
+# message and the message at the watermark. Together with the saved message count, compared with a fresh count of
+# the rows up to the watermark, it tells whether the saved aggregates still describe this database: deleted messages
+# (disappearing messages, manual cleanup) or a different database trigger a full rebuild. Rows edited in place below
+# the watermark are not seen; use a new store for those.
+def get_msgstore_fingerprint(conn, watermark):
+    fingerprint = hashlib.sha1()
+    fingerprint.update(repr(conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'message'").fetchone()).encode())
+    fingerprint.update(repr(conn.execute("SELECT _id, key_id, timestamp FROM message ORDER BY _id LIMIT 1").fetchone()).encode())
+    fingerprint.update(repr(conn.execute("SELECT _id, key_id, timestamp FROM message WHERE _id = ?", (watermark,)).fetchone()).encode())
+    return fingerprint.hexdigest()
+
+# Function to open (or create) the stats store: per-JID aggregates and the highest message._id merged, per source database
+def open_stats_store(stats_store_path):
+    stats_conn = sqlite3.connect(stats_store_path)
+    stats_conn.executescript("""
+        CREATE TABLE IF NOT EXISTS stats_sources (
+            source TEXT PRIMARY KEY,
+            watermark INTEGER NOT NULL,
+            fingerprint TEXT NOT NULL,
+            message_count INTEGER
+        );
+        CREATE TABLE IF NOT EXISTS jid_stats (
+            source TEXT NOT NULL,
+            raw_string TEXT NOT NULL,
+            user TEXT,
+            message_count INTEGER NOT NULL,
+            first_timestamp INTEGER,
+            last_timestamp INTEGER,
+            sent_count INTEGER NOT NULL,
+            received_count INTEGER NOT NULL,
+            PRIMARY KEY (source, raw_string)
+        );
+    """)
+    # Stores written before the message count was kept get the column; their sources are rebuilt once
+    if 'message_count' not in {column_info[1] for column_info in stats_conn.execute("PRAGMA table_info(stats_sources)")}:
+        stats_conn.execute("ALTER TABLE stats_sources ADD COLUMN message_count INTEGER")
+    return stats_conn
+
+# Function to bring the stats of one msgstore.db up to date: only messages above the saved watermark are
+# aggregated and merged, unless the fingerprint or the message count shows the database changed below it
+def update_message_stats(stats_conn, source, conn):
+    saved_state = stats_conn.execute("SELECT watermark, fingerprint, message_count FROM stats_sources WHERE source = ?", (source,)).fetchone()
+    if (saved_state and saved_state[2] is not None and get_msgstore_fingerprint(conn, saved_state[0]) == saved_state[1]
+            and conn.execute(MESSAGE_COUNT_QUERY, (0, saved_state[0])).fetchone()[0] == saved_state[2]):
+        watermark, _, message_count = saved_state
+        update_mode = "incremental"
+    else:
+        watermark = 0
+        message_count = 0
+        update_mode = "full rebuild" if saved_state else "initial build"
+        stats_conn.execute("DELETE FROM jid_stats WHERE source = ?", (source,))
+
+    new_watermark = conn.execute("SELECT COALESCE(MAX(_id), 0) FROM message").fetchone()[0]
+    new_stats = stream_query(conn, """
+        SELECT jid.raw_string, jid.user,
+               COUNT(*),
+               MIN(message.timestamp),
+               MAX(message.timestamp),
+               SUM(message.from_me = 1),
+               SUM(message.from_me = 0)
+        FROM message
+        INNER JOIN chat ON chat._id = message.chat_row_id
+        INNER JOIN jid ON chat.jid_row_id = jid._id
+        WHERE message._id > ? AND message._id <= ? AND jid.raw_string IS NOT NULL
+        GROUP BY jid.raw_string, jid.user
+    """, (watermark, new_watermark))
+    stats_conn.executemany("""
+        INSERT INTO jid_stats (source, raw_string, user, message_count, first_timestamp, last_timestamp, sent_count, received_count)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (source, raw_string) DO UPDATE SET
+            message_count = message_count + excluded.message_count,
+            first_timestamp = MIN(COALESCE(first_timestamp, excluded.first_timestamp), COALESCE(excluded.first_timestamp, first_timestamp)),
+            last_timestamp = MAX(COALESCE(last_timestamp, excluded.last_timestamp), COALESCE(excluded.last_timestamp, last_timestamp)),
+            sent_count = sent_count + excluded.sent_count,
+            received_count = received_count + excluded.received_count
+    """, ((source,) + tuple(row) for row in new_stats))
+    message_count += conn.execute(MESSAGE_COUNT_QUERY, (watermark, new_watermark)).fetchone()[0]
+    stats_conn.execute("INSERT OR REPLACE INTO stats_sources (source, watermark, fingerprint, message_count) VALUES (?, ?, ?, ?)",
+                       (source, new_watermark, get_msgstore_fingerprint(conn, new_watermark), message_count))
+    stats_conn.commit()
+    return update_mode, watermark, new_watermark
+
+# Timeline buckets: strftime formats applied to message.timestamp (UTC)
+TIMELINE_BUCKET_FORMATS = {'day': '%Y-%m-%d', 'hour': '%Y-%m-%d %H:00'}
+TIMELINE_FIELDS = ('raw_string', 'phone_number', 'display_name', 'bucket', 'direction', 'message_type', 'message_count')
+
+# Function to write per-contact message volume by time bucket, direction and message type as CSV.
+# The bucketing is a GROUP BY in SQLite and rows are streamed from the cursor straight to the file.
+def write_timeline(conn, timeline_path, bucket, display_names_by_jid, include_unmatched):
+    timeline_records = stream_query(conn, """
+        SELECT jid.raw_string,
+               jid.user,
+               strftime(?, message.timestamp / 1000, 'unixepoch') AS bucket,
+               CASE WHEN message.from_me = 1 THEN 'sent' ELSE 'received' END AS direction,
+               message.message_type,
+               COUNT(*)
+        FROM jid
+        INNER JOIN chat ON chat.jid_row_id = jid._id
+        INNER JOIN message ON chat._id = message.chat_row_id
+        GROUP BY jid.raw_string, jid.user, bucket, direction, message.message_type
+        ORDER BY jid.raw_string, bucket, direction, message.message_type
+    """, (TIMELINE_BUCKET_FORMATS[bucket],))
+    row_count = 0
+    with open(timeline_path, 'w', newline='', encoding='utf-8') as timeline_file:
+        csv_writer = csv.writer(timeline_file)
+        csv_writer.writerow(TIMELINE_FIELDS)
+        for raw_string, user, bucket_label, direction, message_type, message_count in timeline_records:
+            if raw_string not in display_names_by_jid and not include_unmatched:
+                continue
+            csv_writer.writerow((raw_string, user, display_names_by_jid.get(raw_string), bucket_label, direction, message_type, message_count))
+            row_count += 1
+    return row_count
+
+parser = argparse.ArgumentParser(description="Report the phone numbers involved in WhatsApp message exchanges.")
+parser.add_argument('--zip', help="read 'msgstore.db' and 'wa.db' straight from this extraction ZIP or TAR instead of the script's directory")
+parser.add_argument('--package', help="WhatsApp package folder to read from the ZIP, e.g. com.whatsapp.w4b or data/user/10/com.whatsapp (default: com.whatsapp)")
+parser.add_argument('--include-unmatched', action='store_true', help="also report JIDs without a wa.db contact, such as groups and unknown numbers")
+parser.add_argument('--stats-store', help="keep per-JID message statistics in this SQLite file and only aggregate messages added since the last run")
+parser.add_argument('--timeline', metavar='CSV_PATH', help="also write per-contact message counts by time bucket, direction and message type to this CSV file")
+parser.add_argument('--timeline-bucket', choices=sorted(TIMELINE_BUCKET_FORMATS), default='day', help="timeline bucket size (default: day)")
+parser.add_argument('--explain-queries', action='store_true', help="log EXPLAIN QUERY PLAN for each report query to standard error, flagging full table scans")
+args = parser.parse_args()
+if args.explain_queries:
+    enable_query_plan_logging()
 
 # Explanation about the sorting criteria
 print("\nScript to generate a report of all phone numbers involved in WhatsApp message exchanges.\n")
 print("Results are sorted by Message Count (descending) and then by Display Name.\n\n")
 
 # Prompt the user to place 'msgstore.db' and 'wa.db' databases in the script's directory
-input("Please ensure that 'msgstore.db' and 'wa.db' databases are in the same directory as this script. Press Enter to continue...")
+if args.zip:
+    print(f"Reading 'msgstore.db' and 'wa.db' from: {args.zip}\n")
+else:
+    input("Please ensure that 'msgstore.db' and 'wa.db' databases are in the same directory as this script. Press Enter to continue...")
+
+# Connect to the wa.db database
+try:
+    conn_wa = open_database('wa.db', args.zip, args.package)
+except ValueError as e:
+    parser.error(str(e))
+
+# Query to retrieve display names from wa_contacts in wa.db
+query_wa = """
+    SELECT jid, display_name
+    FROM wa_contacts
+    ORDER BY display_name;
+"""
+
+# Index the wa.db contacts by JID as the rows stream in; when a JID appears more than once the first row (by display name) wins
+display_names_by_jid = {}
+for wa_jid, display_name in stream_query(conn_wa, query_wa):
+    display_names_by_jid.setdefault(wa_jid, display_name)
+
+# Close the connection to wa.db
+if not args.zip:
+    conn_wa.close()
 
 # Connect to the msgstore.db database
-conn_msgstore = sqlite3.connect('msgstore.db')
-cursor_msgstore = conn_msgstore.cursor()
+conn_msgstore = open_database('msgstore.db', args.zip, args.package)
 
 # Query to retrieve phone numbers and their associated message counts
 query_msgstore = """
@@ -26,40 +190,49 @@ query_msgstore = """
     ORDER BY "Message Count" DESC, jid.user;
 """
 
-# Execute the query in msgstore.db
-cursor_msgstore.execute(query_msgstore)
-results_msgstore = cursor_msgstore.fetchall()
-
-# Close the connection to msgstore.db
-conn_msgstore.close()
+# Execute the query in msgstore.db, or update the stats store and read the counts from it
+stats_by_jid = {}
+if args.stats_store:
+    stats_conn = open_stats_store(args.stats_store)
+    stats_source = f"{os.path.abspath(args.zip)}!{load_catalog(args.zip).find_whatsapp_database('msgstore.db', args.package)}" if args.zip else os.path.abspath('msgstore.db')
+    update_mode, old_watermark, new_watermark = update_message_stats(stats_conn, stats_source, conn_msgstore)
+    if new_watermark > old_watermark:
+        print(f"Stats store: {update_mode}, messages with _id {old_watermark + 1} to {new_watermark} aggregated.\n")
+    else:
+        print(f"Stats store: {update_mode}, no new messages since _id {old_watermark}.\n")
+    stats_records = stream_query(stats_conn, """
+        SELECT user, message_count, raw_string,
+               strftime('%Y-%m-%d %H:%M:%S', first_timestamp / 1000, 'unixepoch'),
+               strftime('%Y-%m-%d %H:%M:%S', last_timestamp / 1000, 'unixepoch'),
+               sent_count, received_count
+        FROM jid_stats WHERE source = ?
+        ORDER BY message_count DESC, user""", (stats_source,))
+    message_count_records = []
+    for user, message_count, raw_string, first_timestamp, last_timestamp, sent_count, received_count in stats_records:
+        message_count_records.append((user, message_count, raw_string))
+        stats_by_jid[raw_string] = (first_timestamp, last_timestamp, sent_count, received_count)
+    stats_conn.close()
+else:
+    message_count_records = stream_query(conn_msgstore, query_msgstore)
 
-# Connect to the wa.db database
-conn_wa = sqlite3.connect('wa.db')
-cursor_wa = conn_wa.cursor()
-
-# Query to retrieve display names from wa_contacts in wa.db
-query_wa = """
-    SELECT jid, display_name
-    FROM wa_contacts
-    ORDER BY display_name;
-"""
-
-# Execute the query in wa.db
-cursor_wa.execute(query_wa)
-results_wa = cursor_wa.fetchall()
+# Compare results as the rows stream in: only matched (or, on request, unmatched) JIDs are kept
+sorted_results = []
+unmatched_count = 0
+for phone_number, message_count, raw_string in message_count_records:
+    if raw_string in display_names_by_jid:
+        sorted_results.append((display_names_by_jid[raw_string], phone_number, message_count, raw_string))
+    elif args.include_unmatched:
+        sorted_results.append((None, phone_number, message_count, raw_string))
+        unmatched_count += 1
 
-# Close the connection to wa.db
-conn_wa.close()
+# Write the activity timeline while msgstore.db is still open
+if args.timeline:
+    timeline_rows = write_timeline(conn_msgstore, args.timeline, args.timeline_bucket, display_names_by_jid, args.include_unmatched)
+    print(f"Timeline by {args.timeline_bucket} saved to: {args.timeline} ({timeline_rows} rows)\n")
 
-# Compare and print results
-sorted_results = []
-for msgstore_result in results_msgstore:
-    phone_number, message_count, raw_string = msgstore_result
-    for wa_result in results_wa:
-        wa_jid, display_name = wa_result
-        if raw_string == wa_jid:
-            sorted_results.append((display_name, phone_number, message_count, raw_string))
-            break
+# Close the connection to msgstore.db (connections read from a ZIP stay cached until the end)
+if not args.zip:
+    conn_msgstore.close()
 
 # Sort results by Message Count (descending) and then by Display Name
 sorted_results.sort(key=lambda x: (x[2], x[0] if x[0] is not None else ""), reverse=True)
@@ -70,9 +243,17 @@ for display_name, phone_number, message_count, raw_string in sorted_results:
     print("Phone Number: ", phone_number)
     print("Message Count: ", message_count)
     print("Raw String: ", raw_string)
+    if raw_string in stats_by_jid:
+        first_timestamp, last_timestamp, sent_count, received_count = stats_by_jid[raw_string]
+        print("First Message: ", first_timestamp)
+        print("Last Message: ", last_timestamp)
+        print("Sent / Received: ", sent_count, "/", received_count)
     print("-" * 30)
 
 # Print the total number of contacts with message exchanges
 print("\nTotal number of contacts with message exchanges:", len(sorted_results))
+if args.include_unmatched:
+    print("Of which JIDs without a wa.db contact:", unmatched_count)
+close_archives()
 
 
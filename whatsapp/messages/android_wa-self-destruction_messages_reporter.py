@@ -1,11 +1,119 @@
-import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from itertools import repeat
+from collections import defaultdict
+import argparse
+import csv
 import os
+import posixpath
+import sqlite3
+import sys
 
-# Function to process the database
-def process_database(database_path, results_wa):
-    conn = sqlite3.connect(database_path)
-    cursor = conn.cursor()
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from android_common.archive_databases import ArchiveDatabases, close_archives, open_archive, open_database
+from android_common.artifact_catalog import MSGSTORE_BACKUP, classify_member, load_catalog
+from android_common.query_stream import stream_query
+from android_common.sqlite_connections import enable_query_plan_logging
+
+# Function to list the decrypted 'msgstore' backups stored next to 'msgstore.db' in a ZIP (or TAR)
+def find_backup_members(zip_path, package=None):
+    catalog = load_catalog(zip_path)
+    backup_directory = catalog.get_whatsapp_directory(package) or ''
+    return [member_name for member_name in catalog.get_member_names(MSGSTORE_BACKUP)
+            if posixpath.dirname(member_name) == backup_directory]
+
+# Function to list the backup databases: decrypted 'msgstore*.db' files next to the script, or next to 'msgstore.db'
+# in the ZIP; encrypted .crypt14 files and -wal/-shm files are left out
+def list_backup_files(zip_path, package=None):
+    if zip_path:
+        return find_backup_members(zip_path, package)
+    return [filename for filename in os.listdir('.') if classify_member(filename) == MSGSTORE_BACKUP]
+
+# Function to describe a self-destruction duration in seconds, as the report query does
+def format_setting_duration(setting_duration):
+    if setting_duration == 0:
+        return '(deactivated)'
+    if setting_duration > 86400:
+        return f"{setting_duration // 86400} days"
+    if setting_duration >= 3600:
+        return f"{setting_duration // 3600} hours"
+    if setting_duration >= 60:
+        return f"{setting_duration // 60} minutes"
+    return f"{setting_duration} seconds"
+
+# Function to read every self-destruction setting change of a database with the time of its message.
+# Returns the newest message timestamp, used to order the backups, and the changes as a set of
+# (jid, phone number, message timestamp, duration) tuples so databases can be compared with set operations.
+def load_setting_changes(conn):
+    newest_timestamp = conn.execute("SELECT MAX(timestamp) FROM message").fetchone()[0]
+    setting_changes = set()
+    for change in stream_query(conn, '''
+            SELECT jid.raw_string, jid.user, message.timestamp, message_ephemeral_setting.setting_duration
+            FROM message
+            INNER JOIN chat ON message.chat_row_id = chat._id
+            INNER JOIN message_ephemeral_setting ON message._id = message_ephemeral_setting.message_row_id
+            INNER JOIN jid ON chat.jid_row_id = jid._id
+        '''):
+        setting_changes.add(change)
+    return newest_timestamp or 0, setting_changes
+
+# Function to merge the setting changes of every database into one history per contact.
+# Databases are ordered by their newest message; a change that an older database holds but the next newer one
+# does not, although it predates that database's newest message, was removed in between.
+def build_setting_history(database_changes, contacts_by_jid):
+    database_changes = sorted(database_changes, key=lambda database: database[1])
+    all_changes = set().union(*(setting_changes for _, _, setting_changes in database_changes))
+    seen_in = defaultdict(list)
+    missing_from = defaultdict(list)
+    for database_index, (db_file, newest_timestamp, setting_changes) in enumerate(database_changes):
+        for change in setting_changes:
+            seen_in[change].append(db_file)
+        if database_index > 0:
+            removed_changes = database_changes[database_index - 1][2] - setting_changes
+            for change in removed_changes:
+                if change[2] is not None and change[2] <= newest_timestamp:
+                    missing_from[change].append(db_file)
+
+    history = defaultdict(list)
+    for change in sorted(all_changes, key=lambda change: (change[0], change[2] or 0, change[3])):
+        jid_raw_string, phone_number, message_timestamp, setting_duration = change
+        if jid_raw_string not in contacts_by_jid:
+            continue
+        display_name, wa_name = contacts_by_jid[jid_raw_string]
+        history[(display_name, wa_name, phone_number)].append((message_timestamp, setting_duration, seen_in[change], missing_from[change]))
+    return [database[0] for database in database_changes], history
+
+def format_timestamp(timestamp_ms):
+    if timestamp_ms is None:
+        return None
+    return datetime.fromtimestamp(timestamp_ms / 1000, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+# Function to print the per-contact setting history and optionally save it as CSV
+def report_setting_history(ordered_databases, history, history_csv_path=None):
+    print("\nSelf-destruction setting history across:", ", ".join(ordered_databases))
+    for key, changes in history.items():
+        print("Display Name:", key[0])
+        print("WhatsApp Name:", key[1])
+        print("Phone Number:", key[2])
+        for message_timestamp, setting_duration, seen_in, missing_from in changes:
+            action = "disabled" if setting_duration == 0 else f"enabled with {format_setting_duration(setting_duration)}"
+            print(f"  {format_timestamp(message_timestamp)} UTC: {action} (in {len(seen_in)} of {len(ordered_databases)} databases)")
+            if missing_from:
+                print("    Missing from newer database:", ", ".join(missing_from))
+        print("-" * 30)
 
+    if history_csv_path:
+        with open(history_csv_path, 'w', newline='', encoding='utf-8') as history_file:
+            csv_writer = csv.writer(history_file)
+            csv_writer.writerow(('display_name', 'wa_name', 'phone_number', 'timestamp_utc', 'setting_duration', 'setting', 'seen_in', 'missing_from'))
+            for key, changes in history.items():
+                for message_timestamp, setting_duration, seen_in, missing_from in changes:
+                    csv_writer.writerow(key + (format_timestamp(message_timestamp), setting_duration, format_setting_duration(setting_duration),
+                                               ';'.join(seen_in), ';'.join(missing_from)))
+        print("Setting history saved to:", history_csv_path)
+
+# Function to process the database
+def process_database(conn, contacts_by_jid):
     query_msgstore = '''
         SELECT
             jid.raw_string,
@@ -31,29 +139,66 @@ def process_database(database_path, results_wa):
             jid ON chat.jid_row_id = jid._id
     '''
 
-    cursor.execute(query_msgstore)
-    results_msgstore = cursor.fetchall()
-    conn.close()
-
+    # Rows are aggregated as they stream in; only the per-contact settings are kept
     sorted_results = {}
-    for msgstore_result in results_msgstore:
-        jid_raw_string = msgstore_result[0]
-        phone_number = msgstore_result[1]
-        expiration_setting = msgstore_result[2]
-
-        for wa_result in results_wa:
-            wa_jid, display_name, wa_name = wa_result
-            if jid_raw_string == wa_jid:
-                key = (display_name, wa_name, phone_number)
-                if key not in sorted_results:
-                    sorted_results[key] = [expiration_setting]
-                else:
-                    sorted_results[key].append(expiration_setting)
-                break
+    for jid_raw_string, phone_number, expiration_setting in stream_query(conn, query_msgstore):
+        if jid_raw_string in contacts_by_jid:
+            display_name, wa_name = contacts_by_jid[jid_raw_string]
+            key = (display_name, wa_name, phone_number)
+            if key not in sorted_results:
+                sorted_results[key] = [expiration_setting]
+            else:
+                sorted_results[key].append(expiration_setting)
 
     return sorted_results
 
+# Function to run an analysis on one backup, in a worker process (in_worker) or in the main one.
+# A file SQLite cannot read (still encrypted, truncated) returns the error, so the caller can skip it.
+def run_on_backup(analysis, db_file, zip_path, in_worker, *analysis_arguments):
+    try:
+        if zip_path and in_worker:
+            # A private archive handle: the session cache belongs to the main process
+            archive = ArchiveDatabases(zip_path)
+            try:
+                return analysis(archive.open_database(db_file), *analysis_arguments)
+            finally:
+                archive.close()
+        if zip_path:
+            # The session's archive, whose directory is already read; a backup is released once analysed
+            archive = open_archive(zip_path)
+            try:
+                return analysis(archive.open_database(db_file), *analysis_arguments)
+            finally:
+                archive.release(db_file)
+        conn = open_database(db_file)
+        try:
+            return analysis(conn, *analysis_arguments)
+        finally:
+            conn.close()
+    except sqlite3.DatabaseError as e:
+        return e
+
+def process_backup(db_file, zip_path, in_worker, contacts_by_jid):
+    return run_on_backup(process_database, db_file, zip_path, in_worker, contacts_by_jid)
+
+def load_backup_setting_changes(db_file, zip_path, in_worker):
+    setting_changes = run_on_backup(load_setting_changes, db_file, zip_path, in_worker)
+    if isinstance(setting_changes, sqlite3.DatabaseError):
+        return setting_changes
+    return (db_file,) + setting_changes
+
 def main():
+    parser = argparse.ArgumentParser(description="Report contacts with self-destructing WhatsApp messages enabled.")
+    parser.add_argument('--workers', type=int, default=1, help="number of worker processes analysing backups in parallel (default: 1)")
+    parser.add_argument('--history', action='store_true', help="merge the setting changes of 'msgstore.db' and every backup into one timestamped history per contact")
+    parser.add_argument('--history-csv', help="also save the setting history to this CSV file (implies --history)")
+    parser.add_argument('--zip', help="read 'msgstore.db', 'wa.db' and the decrypted backups straight from this extraction ZIP or TAR")
+    parser.add_argument('--package', help="WhatsApp package folder to read from the ZIP, e.g. com.whatsapp.w4b or data/user/10/com.whatsapp (default: com.whatsapp)")
+    parser.add_argument('--explain-queries', action='store_true', help="log EXPLAIN QUERY PLAN for each report query to standard error, flagging full table scans")
+    args = parser.parse_args()
+    if args.explain_queries:
+        enable_query_plan_logging()
+
     print("**Android WhatsApp Self-destruction Reporter**\n")
     print("Developed by Luca Cadonici\n")
     print("This script connects to the 'msgstore.db' database, retrieving and displaying details on contacts with enabled self-destructing message settings.")
@@ -61,8 +206,10 @@ def main():
     input("Press Enter to continue...")
     print("Please ensure you have the 'msgstore.db', 'wa.db' databases, and any decrypted backup .db files (NO .crypt12, .crypt13, .crypt14 etc.) in the same folder.")
     input("Press Enter to continue...")
-    conn_wa = sqlite3.connect('wa.db')
-    cursor_wa = conn_wa.cursor()
+    try:
+        conn_wa = open_database('wa.db', args.zip, args.package)
+    except ValueError as e:
+        parser.error(str(e))
 
     query_wa = """
         SELECT jid, display_name, wa_name
@@ -70,13 +217,19 @@ def main():
         ORDER BY display_name;
     """
 
-    cursor_wa.execute(query_wa)
-    results_wa = cursor_wa.fetchall()
-    conn_wa.close()
+    # JID -> (display name, WhatsApp name); when a JID appears more than once the first row (by display name) wins
+    contacts_by_jid = {}
+    for wa_jid, display_name, wa_name in stream_query(conn_wa, query_wa):
+        contacts_by_jid.setdefault(wa_jid, (display_name, wa_name))
+    if not args.zip:
+        conn_wa.close()
 
     # Process 'msgstore.db'
     print("Processing data from: msgstore.db")
-    msgstore_db_results = process_database("msgstore.db", results_wa)
+    conn_msgstore = open_database('msgstore.db', args.zip, args.package)
+    msgstore_db_results = process_database(conn_msgstore, contacts_by_jid)
+    if not args.zip:
+        conn_msgstore.close()
 
     # Display results from 'msgstore.db'
     total_msgstore_results = len(msgstore_db_results)
@@ -93,12 +246,20 @@ def main():
     prompt = input("\nDo you want to extend the operation to other backup files? (yes/no): ").strip().lower()
     if prompt == "yes":
         # Get a list of backup files with 'msgstore' in the name
-        database_files = [filename for filename in os.listdir('.') if "msgstore" in filename and filename != "msgstore.db"]
+        database_files = list_backup_files(args.zip, args.package)
 
-        for db_file in database_files:
-            if db_file != "msgstore.db":
+        # Backups are analysed in parallel and reported in order once all are done
+        if args.workers > 1 and len(database_files) > 1:
+            with ProcessPoolExecutor(max_workers=args.workers) as executor:
+                all_backup_results = list(executor.map(process_backup, database_files, repeat(args.zip), repeat(True), repeat(contacts_by_jid)))
+        else:
+            all_backup_results = [process_backup(db_file, args.zip, False, contacts_by_jid) for db_file in database_files]
+
+        for db_file, backup_results in zip(database_files, all_backup_results):
+            if isinstance(backup_results, sqlite3.DatabaseError):
+                print(f"\nSkipping {db_file}: {backup_results}")
+            elif db_file != "msgstore.db":
                 print("\nProcessing data from:", db_file)
-                backup_results = process_database(db_file, results_wa)
                 total_backup_results = len(backup_results)
                 print(f"\nTotal contacts with self-destruction in {db_file}: {total_backup_results}")
                 
@@ -129,5 +290,28 @@ def main():
                 else:
                     print("No differences from msgstore.db")
 
+    # Setting history: 'msgstore.db' (the session's connection) and every backup read once each, in parallel, then merged
+    if args.history or args.history_csv:
+        msgstore_file = load_catalog(args.zip).find_whatsapp_database('msgstore.db', args.package) if args.zip else 'msgstore.db'
+        conn_msgstore = open_database('msgstore.db', args.zip, args.package)
+        database_changes = [(msgstore_file,) + load_setting_changes(conn_msgstore)]
+        if not args.zip:
+            conn_msgstore.close()
+        backup_files = list_backup_files(args.zip, args.package)
+        if args.workers > 1 and len(backup_files) > 1:
+            with ProcessPoolExecutor(max_workers=args.workers) as executor:
+                backup_changes = list(executor.map(load_backup_setting_changes, backup_files, repeat(args.zip), repeat(True)))
+        else:
+            backup_changes = [load_backup_setting_changes(db_file, args.zip, False) for db_file in backup_files]
+        for db_file, setting_changes in zip(backup_files, backup_changes):
+            if isinstance(setting_changes, sqlite3.DatabaseError):
+                print(f"\nSkipping {db_file}: {setting_changes}")
+            else:
+                database_changes.append(setting_changes)
+        ordered_databases, history = build_setting_history(database_changes, contacts_by_jid)
+        report_setting_history(ordered_databases, history, args.history_csv)
+
+    close_archives()
+
 if __name__ == '__main__':
     main()
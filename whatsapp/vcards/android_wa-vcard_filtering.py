@@ -1,72 +1,129 @@
+import argparse
+import csv
+import os
 import sqlite3
+import sys
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from android_common.archive_databases import close_archives, open_database
+from android_common.phone_numbers import PhoneNumberIndex, canonicalize_number
+from android_common.query_stream import stream_query
+from android_common.sqlite_connections import enable_query_plan_logging
+from android_common.vcards import iter_vcard_phones
+
+parser = argparse.ArgumentParser(description="List the contacts shared as vCards in WhatsApp messages.")
+parser.add_argument('--zip', help="read 'msgstore.db' straight from this extraction ZIP or TAR instead of the current directory")
+parser.add_argument('--package', help="WhatsApp package folder to read from the ZIP, e.g. com.whatsapp.w4b or data/user/10/com.whatsapp (default: com.whatsapp)")
+parser.add_argument('--enriched', metavar='CSV_PATH', help="also write every shared card with its message, chat, sender and wa.db match to this CSV file")
+parser.add_argument('--explain-queries', action='store_true', help="log EXPLAIN QUERY PLAN for each report query to standard error, flagging full table scans")
+args = parser.parse_args()
+if args.explain_queries:
+    enable_query_plan_logging()
 
 # Connect to the database
-conn = sqlite3.connect('msgstore.db')
-cursor = conn.cursor()
+try:
+    conn = open_database('msgstore.db', args.zip, args.package)
+except ValueError as e:
+    parser.error(str(e))
 
-# Execute query to fetch distinct vCards
+# Query to fetch distinct vCards; the vCards are streamed and only the extracted details are kept
 distinct_vcards_query = "SELECT DISTINCT vcard FROM message_vcard"
-cursor.execute(distinct_vcards_query)
-distinct_vcards = cursor.fetchall()
 
-# Calculate the number of distinct vCards
-num_distinct_vcards = len(distinct_vcards)
+# Every (FN, TEL, label, waid) of every vCard, deduplicated by canonical number in one pass:
+# canonical number -> [first VCardPhone seen, number of times shared, other names it was shared under]
+phones_by_number = {}
+num_distinct_vcards = 0
+for (vcard_data,) in stream_query(conn, distinct_vcards_query):
+    num_distinct_vcards += 1
+    if not vcard_data:
+        continue
+    for vcard_phone in iter_vcard_phones(vcard_data):
+        number_key = canonicalize_number(vcard_phone.waid or vcard_phone.tel) or vcard_phone.tel
+        phone_entry = phones_by_number.get(number_key)
+        if phone_entry is None:
+            phones_by_number[number_key] = [vcard_phone, 1, set()]
+        else:
+            phone_entry[1] += 1
+            if vcard_phone.fn != phone_entry[0].fn:
+                phone_entry[2].add(vcard_phone.fn)
+
+# Print the number of distinct vCards and shared numbers
 print("Number of distinct vCards:", num_distinct_vcards)
+print("Number of distinct phone numbers:", len(phones_by_number))
 print("-" * 30)
 
-# Create a list to store extracted vCard details
-vcard_details = []
-
-# Function to clean phone number
-def clean_phone_number(number):
-    # Remove spaces and numbers between ":" and "+"
-    clean_number = ''.join(part for part in number.split(':') if not part.strip().isdigit() and part != '+')
-    return clean_number
-
-# Loop through distinct vCards and extract details
-for vcard_row in distinct_vcards:
-    vcard_data = vcard_row[0]
-    fn = ""
-    tel = ""
-    label = ""
-
-    lines = vcard_data.split('\n')
-    for line in lines:
-        if line.startswith('FN:'):
-            fn = line[3:]
-        elif "TEL" in line:
-            tel_parts = line.split('TEL')[1].strip()
-            tel = ""
-            label = ""
+# Print the vCard details sorted alphabetically by FN
+for vcard_phone, share_count, other_names in sorted(phones_by_number.values(), key=lambda phone_entry: phone_entry[0].fn):
+    print("FN:", vcard_phone.fn)
+    print("Phone Number:", vcard_phone.tel.replace(" ", ""))  # Remove spaces from phone number
+    print("WhatsApp ID:", vcard_phone.waid)
+    print("Label:", vcard_phone.label)
+    print("Shared in vCards:", share_count)
+    if other_names:
+        print("Also shared as:", ", ".join(sorted(other_names)))
+    print("-" * 30)
 
-            for part in tel_parts.split(';'):
-                if part.startswith('type='):
-                    label = part[5:]
-                elif part.startswith('waid='):
-                    tel = part[5:].strip()  # Apply strip() to remove spaces
-            if not tel:
-                tel = tel_parts.strip()  # Apply strip() to remove spaces
-        elif line.startswith('item1.X-ABLabel:'):
-            label = line[16:]
+# Enriched report: who shared whom, when, in which chat, and whether that number is known in wa.db
+ENRICHED_FIELDS = ('shared_at_utc', 'message_id', 'chat_jid', 'chat_name', 'direction', 'sender_jid', 'sender_name',
+                   'card_fn', 'card_tel', 'card_label', 'card_waid', 'known_in_wa_db', 'contact_jid', 'contact_display_name',
+                   'contact_wa_name', 'whatsapp_user')
 
-    # If item1.TEL: is not present, look for item1.TEL;waid=
-    if not tel:
-        for line in lines:
-            if "waid=" in line:
-                tel = line.split('=')[1].strip()  # Apply strip() to remove spaces
+enriched_vcards_query = """
+    SELECT message_vcard.vcard,
+           message._id,
+           message.timestamp,
+           message.from_me,
+           chat_jid.raw_string,
+           sender_jid.raw_string
+    FROM message_vcard
+    INNER JOIN message ON message._id = message_vcard.message_row_id
+    INNER JOIN chat ON chat._id = message.chat_row_id
+    INNER JOIN jid AS chat_jid ON chat_jid._id = chat.jid_row_id
+    LEFT JOIN jid AS sender_jid ON sender_jid._id = message.sender_jid_row_id
+    ORDER BY message.timestamp, message._id
+"""
 
-    if tel:  # Check if tel value is not empty
-        tel = clean_phone_number(tel)  # Clean phone number
-        vcard_details.append((fn, tel, label))
+if args.enriched:
+    # wa.db contacts indexed once: by JID for chats and senders, by canonical number for the shared cards
+    names_by_jid = {}
+    wa_number_index = PhoneNumberIndex()
+    try:
+        conn_wa = open_database('wa.db', args.zip, args.package)
+        for wa_jid, wa_number, display_name, wa_name, is_whatsapp_user in stream_query(conn_wa, """
+                SELECT jid, number, display_name, wa_name, is_whatsapp_user FROM wa_contacts ORDER BY display_name"""):
+            names_by_jid.setdefault(wa_jid, display_name or wa_name)
+            wa_number_index.add(wa_jid if canonicalize_number(wa_jid) else wa_number, (wa_jid, display_name, wa_name, is_whatsapp_user))
+        if not args.zip:
+            conn_wa.close()
+    except (sqlite3.Error, FileNotFoundError) as e:
+        print(f"'wa.db' not available, shared numbers are not resolved: {e}")
 
-# Sort the vCard details list alphabetically by FN
-vcard_details.sort(key=lambda x: x[0])
+    enriched_rows = 0
+    known_rows = 0
+    with open(args.enriched, 'w', newline='', encoding='utf-8') as enriched_file:
+        csv_writer = csv.writer(enriched_file)
+        csv_writer.writerow(ENRICHED_FIELDS)
+        for vcard_data, message_id, timestamp, from_me, chat_raw_string, sender_raw_string in stream_query(conn, enriched_vcards_query):
+            shared_at = datetime.fromtimestamp(timestamp / 1000, timezone.utc).strftime('%Y-%m-%d %H:%M:%S') if timestamp else None
+            # Sent cards come from the device owner; received ones from the group member, or the chat partner
+            if from_me:
+                direction, sender_jid = 'sent', None
+            else:
+                direction, sender_jid = 'received', sender_raw_string or chat_raw_string
+            for vcard_phone in iter_vcard_phones(vcard_data or ''):
+                wa_matches = wa_number_index.match(vcard_phone.waid or vcard_phone.tel)
+                contact_jid, contact_display_name, contact_wa_name, whatsapp_user = wa_matches[0] if wa_matches else (None, None, None, None)
+                csv_writer.writerow((shared_at, message_id, chat_raw_string, names_by_jid.get(chat_raw_string), direction,
+                                     sender_jid, names_by_jid.get(sender_jid), vcard_phone.fn, vcard_phone.tel, vcard_phone.label,
+                                     vcard_phone.waid, 'yes' if wa_matches else 'no', contact_jid, contact_display_name,
+                                     contact_wa_name, whatsapp_user))
+                enriched_rows += 1
+                known_rows += bool(wa_matches)
+    print(f"Enriched vCard report saved to: {args.enriched} ({enriched_rows} shared numbers, {known_rows} known in wa.db)")
 
-# Print the sorted vCard details
-for fn, tel, label in vcard_details:
-    print("FN:", fn)
-    print("Phone Number:", tel.replace(" ", ""))  # Remove spaces from phone number
-    print("Label:", label)
-    print("-" * 30)
 # Close the database connection
-conn.close()
+if args.zip:
+    close_archives()
+else:
+    conn.close()